@@ -0,0 +1,108 @@
+#Background audio playback for local (non-Gradio) use
+#play() only queues the file and returns; one worker thread plays the queue in
+#order with a player that understands the format (aplay is WAV-only, so MP3 goes
+#to mpg123/ffplay). stop() kills the current clip and drops everything queued.
+import os
+import queue
+import shutil
+import logging
+import platform
+import threading
+import subprocess
+from typing import List, Optional
+
+
+def player_command(filepath: str) -> Optional[List[str]]:
+    """Command line that plays `filepath` on this OS, or None if there is no player"""
+    os_name = platform.system()
+    is_wav = os.path.splitext(filepath)[1].lower() == ".wav"
+    ffplay = shutil.which("ffplay") or shutil.which("C:\\ffmpeg\\bin\\ffplay.exe")
+
+    if os_name == "Darwin":  # macOS, afplay handles both
+        return ["afplay", filepath]
+    if os_name == "Windows":
+        if is_wav:
+            return ["powershell", "-c", f'(New-Object Media.SoundPlayer "{filepath}").PlaySync();']
+        if ffplay:
+            return [ffplay, "-nodisp", "-autoexit", "-loglevel", "quiet", filepath]
+        return None
+    if os_name == "Linux":
+        if is_wav and shutil.which("aplay"):
+            return ["aplay", "-q", filepath]
+        if shutil.which("mpg123") and not is_wav:
+            return ["mpg123", "-q", filepath]
+        if shutil.which("paplay") and is_wav:
+            return ["paplay", filepath]
+        if ffplay:
+            return [ffplay, "-nodisp", "-autoexit", "-loglevel", "quiet", filepath]
+        return None
+    return None
+
+
+class AudioPlayer:
+    """Plays queued audio files one after another in a daemon thread"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._current: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        # Bumped by stop(), so clips queued before it are skipped
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, name="audio-player", daemon=True)
+        self._thread.start()
+
+    def play(self, filepath: str) -> None:
+        """Queue a file for playback and return immediately"""
+        with self._lock:
+            self._queue.put((self._generation, filepath))
+
+    def stop(self) -> None:
+        """Cancel the clip that is playing and everything queued behind it"""
+        with self._lock:
+            self._generation += 1
+            current = self._current
+        if current is not None and current.poll() is None:
+            current.terminate()
+
+    def wait(self) -> None:
+        """Block until the queue has been played (for scripts)"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            generation, filepath = self._queue.get()
+            try:
+                if generation == self._generation:
+                    self._play(generation, filepath)
+            except Exception as e:
+                print(f"An error occurred while trying to play the audio: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _play(self, generation: int, filepath: str) -> None:
+        command = player_command(filepath)
+        if command is None:
+            logging.warning(f"No audio player found for {filepath}")
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._current = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self._current.wait()
+        finally:
+            with self._lock:
+                self._current = None
+
+
+_player = None
+_player_lock = threading.Lock()
+
+
+def get_audio_player() -> AudioPlayer:
+    """Process-wide player (its thread starts on first use)"""
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = AudioPlayer()
+        return _player
@@ -0,0 +1,99 @@
+#Clean up a voice recording before it is uploaded for transcription
+#Leading/trailing silence is trimmed, long pauses are shortened, and the audio is
+#downmixed to mono 16 kHz (what Whisper resamples to anyway) and level-normalized.
+#Less audio to upload and to transcribe, same words.
+import io
+import os
+import logging
+from typing import Tuple, Union
+
+from pydub import AudioSegment
+from pydub.effects import normalize
+from pydub.silence import detect_nonsilent
+
+from telemetry import span
+
+STT_PREPROCESS = os.environ.get("DOCTOR_STT_PREPROCESS", "1") == "1"
+STT_SAMPLE_RATE = 16000
+# Pauses longer than this are cut down to it
+MAX_PAUSE_MS = int(os.environ.get("DOCTOR_STT_MAX_PAUSE_MS", "600"))
+MIN_SILENCE_MS = 300
+# Silence threshold relative to the recording's average loudness
+SILENCE_OFFSET_DB = 16
+# Speech edges kept around each non-silent range so words aren't clipped
+EDGE_MS = 150
+
+
+class PreprocessedAudio:
+    """Recording ready for upload, with before/after sizes for logging and benchmarks"""
+
+    def __init__(self, data: bytes, filename: str, duration_ms: int, original_ms: int, original_bytes: int):
+        self.data = data
+        self.filename = filename
+        self.duration_ms = duration_ms
+        self.original_ms = original_ms
+        self.original_bytes = original_bytes
+
+    @property
+    def payload(self) -> Tuple[str, bytes]:
+        """(filename, bytes) as accepted by transcribe_with_groq"""
+        return self.filename, self.data
+
+
+def condense(segment: AudioSegment, max_pause_ms: int = MAX_PAUSE_MS) -> AudioSegment:
+    """Trim silence at both ends and shorten the pauses in between"""
+    ranges = detect_nonsilent(
+        segment,
+        min_silence_len=MIN_SILENCE_MS,
+        silence_thresh=segment.dBFS - SILENCE_OFFSET_DB,
+    )
+    if not ranges:
+        return segment
+
+    condensed = AudioSegment.empty()
+    previous_end = None
+    for start, end in ranges:
+        start = max(0, start - EDGE_MS)
+        end = min(len(segment), end + EDGE_MS)
+        if previous_end is not None and start > previous_end:
+            # Keep some of the pause, speech without any gaps is harder to transcribe
+            condensed += segment[previous_end:min(start, previous_end + max_pause_ms)]
+        condensed += segment[max(start, previous_end or 0):end]
+        previous_end = end
+    return condensed
+
+
+def preprocess_audio(audio: Union[str, bytes], fmt: str = "wav") -> PreprocessedAudio:
+    """Trim, condense, downmix to mono 16 kHz and normalize a recording (path or bytes)"""
+    if isinstance(audio, str):
+        original_bytes = os.path.getsize(audio)
+        segment = AudioSegment.from_file(audio)
+    else:
+        original_bytes = len(audio)
+        segment = AudioSegment.from_file(io.BytesIO(audio))
+    original_ms = len(segment)
+
+    segment = segment.set_channels(1).set_frame_rate(STT_SAMPLE_RATE).set_sample_width(2)
+    segment = normalize(condense(segment), headroom=1.0)
+
+    buffer = io.BytesIO()
+    segment.export(buffer, format=fmt)
+    return PreprocessedAudio(buffer.getvalue(), f"audio.{fmt}", len(segment), original_ms, original_bytes)
+
+
+def preprocess_for_stt(audio_filepath: str) -> Union[str, Tuple[str, bytes]]:
+    """Upload payload for a recording, or the original path if preprocessing is off or fails"""
+    if not STT_PREPROCESS:
+        return audio_filepath
+    try:
+        with span("audio_preprocess") as attrs:
+            result = preprocess_audio(audio_filepath)
+            attrs["bytes_saved"] = result.original_bytes - len(result.data)
+    except Exception as e:
+        logging.warning(f"Audio preprocessing failed, uploading the original: {e}")
+        return audio_filepath
+    logging.info(
+        f"Audio preprocessed: {result.original_bytes} -> {len(result.data)} bytes, "
+        f"{result.original_ms / 1000:.1f} -> {result.duration_ms / 1000:.1f} s"
+    )
+    return result.payload
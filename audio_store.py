@@ -0,0 +1,86 @@
+#Managed directory for generated response audio
+#Every file gets a unique name (no two requests can overwrite each other) and a
+#background thread deletes files by age and keeps the directory under a size cap.
+#Set DOCTOR_AUDIO_TMPFS=1 to keep the files in RAM-backed /dev/shm where available.
+import os
+import uuid
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from caching import evict_files
+
+AUDIO_TMPFS = os.environ.get("DOCTOR_AUDIO_TMPFS", "0") == "1"
+AUDIO_MAX_AGE = float(os.environ.get("DOCTOR_AUDIO_MAX_AGE", "900"))  # seconds
+AUDIO_MAX_BYTES = int(os.environ.get("DOCTOR_AUDIO_MAX_BYTES", str(200 * 1024 * 1024)))
+AUDIO_CLEANUP_INTERVAL = float(os.environ.get("DOCTOR_AUDIO_CLEANUP_INTERVAL", "60"))
+
+
+def default_audio_dir() -> str:
+    if os.environ.get("DOCTOR_AUDIO_DIR"):
+        return os.environ["DOCTOR_AUDIO_DIR"]
+    if AUDIO_TMPFS and os.path.isdir("/dev/shm"):
+        return "/dev/shm/ai_doctor_audio"
+    return os.path.join(tempfile.gettempdir(), "ai_doctor_audio")
+
+
+class AudioStore:
+    """Bounded directory of response audio files with background cleanup"""
+
+    def __init__(
+        self,
+        root: str = None,
+        max_age: float = AUDIO_MAX_AGE,
+        max_bytes: int = AUDIO_MAX_BYTES,
+        cleanup_interval: float = AUDIO_CLEANUP_INTERVAL,
+    ):
+        self.root = Path(root or default_audio_dir())
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def new_path(self, suffix: str = ".mp3") -> str:
+        """A fresh, unique path inside the store"""
+        return str(self.root / f"response_{uuid.uuid4().hex}{suffix}")
+
+    def cleanup(self, now: float = None) -> int:
+        """Delete expired files, then the oldest ones until under the size cap"""
+        with self._lock:
+            removed, _ = evict_files(self.root.iterdir(), self.max_bytes, self.max_age, now)
+            return removed
+
+    def start_cleanup(self) -> None:
+        """Run `cleanup` periodically in a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._cleanup_loop, name="audio-store-cleanup", daemon=True)
+        self._thread.start()
+
+    def stop_cleanup(self) -> None:
+        self._stop.set()
+
+    def _cleanup_loop(self) -> None:
+        while not self._stop.wait(self.cleanup_interval):
+            try:
+                self.cleanup()
+            except Exception as e:
+                logging.error(f"Audio store cleanup failed: {e}")
+
+
+_audio_store = None
+_audio_store_lock = threading.Lock()
+
+
+def get_audio_store() -> AudioStore:
+    """Process-wide audio store; its cleanup thread starts on first use"""
+    global _audio_store
+    with _audio_store_lock:
+        if _audio_store is None:
+            _audio_store = AudioStore()
+            _audio_store.start_cleanup()
+        return _audio_store
@@ -0,0 +1,77 @@
+"""
+Audio preprocessing benchmark: what trimming/condensing/downmixing saves per upload.
+
+For each recording, prints the size and duration before and after
+preprocess_audio, the time the preprocessing itself took, and the upload time
+saved at the given uplink speed. Without arguments a synthetic 44.1 kHz stereo
+"voice memo" (tone bursts separated by long pauses) is generated.
+
+    python benchmarks/bench_audio_preprocessing.py recordings/*.wav --uplink-mbps 2
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_recording() -> bytes:
+    """30 s of 'speech' bursts with pauses and 2 s of silence at both ends, as WAV"""
+    import io
+    from pydub import AudioSegment
+    from pydub.generators import Sine, WhiteNoise
+
+    pause_lengths = [400, 2500, 800, 4000, 300, 1800]
+    memo = AudioSegment.silent(duration=2000, frame_rate=44100)
+    for i in range(12):
+        burst = Sine(180 + 20 * i).to_audio_segment(duration=1500, volume=-18)
+        burst = burst.overlay(WhiteNoise().to_audio_segment(duration=1500, volume=-30))
+        memo += burst + AudioSegment.silent(duration=pause_lengths[i % len(pause_lengths)], frame_rate=44100)
+    memo += AudioSegment.silent(duration=2000, frame_rate=44100)
+    memo = memo.set_channels(2).set_frame_rate(44100)
+
+    buffer = io.BytesIO()
+    memo.export(buffer, format="wav")
+    return buffer.getvalue()
+
+
+def run(label, audio, fmt, uplink_mbps):
+    from audio_preprocessing import preprocess_audio
+
+    start = time.perf_counter()
+    result = preprocess_audio(audio, fmt=fmt)
+    elapsed = time.perf_counter() - start
+
+    saved_bytes = result.original_bytes - len(result.data)
+    upload_saved = saved_bytes * 8 / (uplink_mbps * 1_000_000)
+    print(
+        f"{label:<28} {result.original_bytes / 1024:8.0f} KB -> {len(result.data) / 1024:6.0f} KB "
+        f"({saved_bytes / max(result.original_bytes, 1):.0%} smaller), "
+        f"{result.original_ms / 1000:5.1f} s -> {result.duration_ms / 1000:5.1f} s of audio, "
+        f"preprocessing {elapsed * 1000:.0f} ms, upload saved {upload_saved:.2f} s @ {uplink_mbps} Mbit/s"
+    )
+    return saved_bytes, (result.original_ms - result.duration_ms) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="*", help="audio files (default: a synthetic memo)")
+    parser.add_argument("--format", default="wav", choices=["wav", "flac", "mp3"])
+    parser.add_argument("--uplink-mbps", type=float, default=2.0)
+    args = parser.parse_args()
+
+    samples = [(os.path.basename(path), path) for path in args.recordings]
+    if not samples:
+        samples = [("synthetic memo", synthetic_recording())]
+
+    total_bytes = total_seconds = 0
+    for label, audio in samples:
+        saved_bytes, saved_seconds = run(label, audio, args.format, args.uplink_mbps)
+        total_bytes += saved_bytes
+        total_seconds += saved_seconds
+    print(f"total: {total_bytes / 1024:.0f} KB and {total_seconds:.1f} s of audio saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Connection reuse benchmark: a new Groq() per request vs the pooled registry.
+
+Runs a local stub of the Groq chat completions endpoint and counts how many
+TCP connections each strategy opens. Every new connection is a TCP (and, on
+the real API, TLS) handshake the request has to wait for.
+
+    python benchmarks/bench_client_pool.py --requests 200 --threads 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMPLETION = json.dumps({
+    "id": "stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub-model",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "You look healthy."},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 4, "total_tokens": 14},
+}).encode()
+
+
+class StubGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        # One handler instance per accepted TCP connection
+        with StubGroqHandler.lock:
+            StubGroqHandler.connections += 1
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, make_client, requests, threads):
+    StubGroqHandler.connections = 0
+
+    def one_request(_):
+        client = make_client()
+        client.chat.completions.create(
+            model="stub-model",
+            messages=[{"role": "user", "content": "Is there something wrong with my face?"}],
+        )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<18} {requests} requests in {elapsed:.3f}s "
+        f"({elapsed / requests * 1000:.2f} ms/request), "
+        f"{StubGroqHandler.connections} TCP connections"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("GROQ_API_KEY", "stub-key")
+
+    from groq import Groq
+    from groq_clients import get_groq_client, close_all
+
+    run("new Groq() each", lambda: Groq(), args.requests, args.threads)
+    run("pooled registry", get_groq_client, args.requests, args.threads)
+
+    close_all()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
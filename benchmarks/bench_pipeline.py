@@ -0,0 +1,243 @@
+"""
+End-to-end consultation benchmark with stubbed Groq, ChatGroq, gTTS and ElevenLabs.
+
+Drives AIDoctor.process_message (process_message_async with --async) through
+text-only, image, audio and large-PDF turns at several concurrency levels and
+reports throughput, p50/p95/p99 latency, time to first audio and peak RSS.
+Backends are local stand-ins (benchmarks/stub_backends.py) with configurable
+latency and token rate, so no network or API keys are needed. Every
+scenario/concurrency pair runs in a fresh process, so caches and peak RSS
+don't carry over from one to the next.
+
+    python benchmarks/bench_pipeline.py --scenarios text,image,audio,pdf --concurrency 1,8,32
+    python benchmarks/bench_pipeline.py --json baseline.json
+    python benchmarks/bench_pipeline.py --baseline baseline.json --tolerance 0.15
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("text", "image", "audio", "pdf")
+RESULT_PREFIX = "RESULT "
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None, None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    # Largest finished child, e.g. a PDF extraction worker
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def unique_copy(path, i, workdir):
+    """Same content plus a trailing marker, so content-hash caches see a new upload"""
+    root, ext = os.path.splitext(os.path.basename(path))
+    copy_path = os.path.join(workdir, f"{root}_{i}{ext}")
+    shutil.copyfile(path, copy_path)
+    with open(copy_path, "ab") as f:
+        f.write(f"\n%bench-{i}\n".encode())
+    return copy_path
+
+
+def scenario_inputs(scenario, workdir, pdf_pages):
+    """A function i -> process_message kwargs for request i"""
+    from stub_backends import make_image, make_pdf, make_wav
+
+    if scenario == "text":
+        return lambda i: {"message": "I have had a dry cough and a mild fever for two days, what should I do?"}
+    if scenario == "image":
+        image = make_image(os.path.join(workdir, "rash.jpg"))
+        return lambda i: {"message": "Is there something wrong with my face?", "image_filepath": unique_copy(image, i, workdir)}
+    if scenario == "audio":
+        recording = make_wav(os.path.join(workdir, "memo.wav"))
+        return lambda i: {"message": "", "audio_filepath": recording}
+    if scenario == "pdf":
+        report = make_pdf(os.path.join(workdir, "report.pdf"), pages=pdf_pages)
+        return lambda i: {"message": "Is my blood report normal?", "file_filepath": unique_copy(report, i, workdir)}
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def run_worker(args):
+    from stub_backends import StubConfig, install
+
+    install(StubConfig(
+        llm_latency=args.llm_latency,
+        token_rate=args.token_rate,
+        stt_latency=args.stt_latency,
+        tts_latency=args.tts_latency,
+    ))
+    from gradio_app import AIDoctor
+    from telemetry import metrics
+
+    workdir = tempfile.mkdtemp(prefix="ai_doctor_bench_inputs_")
+    make_inputs = scenario_inputs(args.worker, workdir, args.pdf_pages)
+    doctor = AIDoctor()
+
+    def run_one(i):
+        start = time.perf_counter()
+        first_audio = None
+        for _, _, audio in doctor.process_message(session_id=f"bench-{i}", **make_inputs(i)):
+            if audio and first_audio is None:
+                first_audio = time.perf_counter() - start
+        return time.perf_counter() - start, first_audio
+
+    async def arun_one(i, semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            first_audio = None
+            async for _, _, audio in doctor.process_message_async(session_id=f"bench-{i}", **make_inputs(i)):
+                if audio and first_audio is None:
+                    first_audio = time.perf_counter() - start
+            return time.perf_counter() - start, first_audio
+
+    async def arun_all():
+        semaphore = asyncio.Semaphore(args.worker_concurrency)
+        return await asyncio.gather(*[arun_one(i, semaphore) for i in range(1, args.requests + 1)])
+
+    # Warm-up request (imports, thread pools, connection setup) isn't measured
+    run_one(0)
+    metrics.reset()
+
+    start = time.perf_counter()
+    if args.use_async:
+        results = asyncio.run(arun_all())
+    else:
+        with ThreadPoolExecutor(max_workers=args.worker_concurrency) as executor:
+            results = list(executor.map(run_one, range(1, args.requests + 1)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    first_audio = [t for _, t in results if t is not None]
+    own_rss, children_rss = peak_rss_mb()
+    stages = {
+        series: round(h["sum"] / h["count"] * 1000, 1)
+        for series, h in metrics.snapshot()["histograms"].items()
+        if series.startswith("doctor_stage_duration_seconds") and h["count"]
+    }
+    result = {
+        "scenario": args.worker,
+        "concurrency": args.worker_concurrency,
+        "async": args.use_async,
+        "requests": args.requests,
+        "throughput": round(args.requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "first_audio_p50_ms": round(percentile(first_audio, 50) * 1000, 1) if first_audio else None,
+        "peak_rss_mb": own_rss,
+        "children_peak_rss_mb": children_rss,
+        "stage_mean_ms": {s.split('stage="')[1].rstrip('"}'): ms for s, ms in stages.items()},
+    }
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def run_one_process(args, scenario, concurrency):
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--worker", scenario,
+        "--worker-concurrency", str(concurrency),
+        "--requests", str(args.requests),
+        "--llm-latency", str(args.llm_latency),
+        "--token-rate", str(args.token_rate),
+        "--stt-latency", str(args.stt_latency),
+        "--tts-latency", str(args.tts_latency),
+        "--pdf-pages", str(args.pdf_pages),
+    ]
+    if args.use_async:
+        command.append("--async")
+    output = subprocess.run(command, capture_output=True, text=True)
+    for line in output.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    sys.stderr.write(output.stderr[-4000:])
+    raise RuntimeError(f"{scenario} @ {concurrency} failed (exit code {output.returncode})")
+
+
+def compare(results, baseline_path, tolerance):
+    """Print regressions against a saved run; returns True if there are none"""
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["concurrency"], r["async"]): r for r in json.load(f)}
+    ok = True
+    for result in results:
+        before = baseline.get((result["scenario"], result["concurrency"], result["async"]))
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            print(f"REGRESSION {result['scenario']} @ {result['concurrency']}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+            ok = False
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            print(f"REGRESSION {result['scenario']} @ {result['concurrency']}: throughput {before['throughput']} -> {result['throughput']} req/s")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=32, help="measured requests per scenario and concurrency")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use process_message_async")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="stub tokens per second")
+    parser.add_argument("--stt-latency", type=float, default=0.4)
+    parser.add_argument("--tts-latency", type=float, default=0.25, help="stub seconds per sentence")
+    parser.add_argument("--pdf-pages", type=int, default=200)
+    parser.add_argument("--json", help="save the results here (e.g. as a baseline)")
+    parser.add_argument("--baseline", help="compare against a saved --json run")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    # Internal: run one scenario in this process
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-concurrency", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = []
+    print(f"{'scenario':<8} {'conc':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'1st audio':>9} {'RSS MB':>7}")
+    for scenario in args.scenarios.split(","):
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            result = run_one_process(args, scenario, concurrency)
+            results.append(result)
+            print(
+                f"{scenario:<8} {concurrency:>4} {result['throughput']:>7} {result['p50_ms']:>8} "
+                f"{result['p95_ms']:>8} {result['p99_ms']:>8} {str(result['first_audio_p50_ms']):>9} "
+                f"{str(result['peak_rss_mb']):>7}"
+            )
+            slowest = sorted(result["stage_mean_ms"].items(), key=lambda item: -item[1])[:5]
+            print("              " + ", ".join(f"{stage} {ms} ms" for stage, ms in slowest))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Local stand-ins for Groq, ChatGroq, gTTS and ElevenLabs.
+
+Each one sleeps for a configurable latency and emits tokens at a
+configurable rate, so the whole pipeline can be benchmarked without network
+access or API keys. Call `install(StubConfig(...))` BEFORE importing
+gradio_app: the app modules bind the client factories at import time.
+"""
+import os
+import io
+import time
+import asyncio
+import tempfile
+import itertools
+import threading
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# One MPEG-1 Layer III frame header (128 kbit/s, 44.1 kHz); the rest of the frame is silence
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+REPLY = (
+    "With what I see, I think you have a mild irritation of the skin that should settle "
+    "with gentle cleansing and a fragrance free moisturizer twice a day. If it spreads, "
+    "becomes painful or you develop a fever, please see a doctor in person soon."
+)
+
+
+class StubConfig:
+    def __init__(
+        self,
+        llm_latency: float = 0.3,
+        token_rate: float = 200.0,
+        stt_latency: float = 0.4,
+        stt_bytes_per_second: float = 2_000_000,
+        tts_latency: float = 0.25,
+        reply: str = REPLY,
+        vary_replies: bool = True,
+    ):
+        self.llm_latency = llm_latency  # time to first token, seconds
+        self.token_rate = token_rate  # tokens per second after that
+        self.stt_latency = stt_latency
+        self.stt_bytes_per_second = stt_bytes_per_second  # upload + processing
+        self.tts_latency = tts_latency  # per synthesized sentence
+        self.reply = reply
+        # Real answers differ per patient; without this every sentence after the
+        # first request would come from the TTS cache
+        self.vary_replies = vary_replies
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_reply(self) -> str:
+        if not self.vary_replies:
+            return self.reply
+        with self._lock:
+            n = next(self._counter)
+        # Vary every sentence, since speech is synthesized (and cached) per sentence
+        return self.reply.replace(". ", f", case {n}. ")
+
+    def tokens(self) -> List[str]:
+        return [word + " " for word in self.next_reply().split()]
+
+
+def _payload_size(file: Any) -> int:
+    if isinstance(file, tuple):
+        file = file[1]
+    if isinstance(file, (bytes, bytearray)):
+        return len(file)
+    if hasattr(file, "read"):
+        return len(file.read())
+    return os.path.getsize(file)
+
+
+# --- Groq -------------------------------------------------------------------
+
+def _completion(text: str, tokens: int):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")],
+        usage=SimpleNamespace(completion_tokens=tokens, prompt_tokens=0, total_tokens=tokens),
+    )
+
+
+def _chunk(token: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+
+class _Completions:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    def create(self, messages, model, stream=False, **kwargs):
+        tokens = self.config.tokens()
+        time.sleep(self.config.llm_latency)
+        if not stream:
+            time.sleep(len(tokens) / self.config.token_rate)
+            return _completion("".join(tokens).strip(), len(tokens))
+        return self._stream(tokens)
+
+    def _stream(self, tokens) -> Iterator:
+        for token in tokens:
+            yield _chunk(token)
+            time.sleep(1 / self.config.token_rate)
+
+
+class _Transcriptions:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    def create(self, model, file, **kwargs):
+        size = _payload_size(file)
+        time.sleep(self.config.stt_latency + size / self.config.stt_bytes_per_second)
+        return SimpleNamespace(text="I have had an itchy red rash on my cheek for three days.")
+
+
+class StubGroq:
+    def __init__(self, config: StubConfig):
+        self.chat = SimpleNamespace(completions=_Completions(config))
+        self.audio = SimpleNamespace(transcriptions=_Transcriptions(config))
+
+
+class _AsyncCompletions:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    async def create(self, messages, model, stream=False, **kwargs):
+        tokens = self.config.tokens()
+        await asyncio.sleep(self.config.llm_latency)
+        if not stream:
+            await asyncio.sleep(len(tokens) / self.config.token_rate)
+            return _completion("".join(tokens).strip(), len(tokens))
+        return self._stream(tokens)
+
+    async def _stream(self, tokens) -> AsyncIterator:
+        for token in tokens:
+            yield _chunk(token)
+            await asyncio.sleep(1 / self.config.token_rate)
+
+
+class _AsyncTranscriptions:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    async def create(self, model, file, **kwargs):
+        size = _payload_size(file)
+        await asyncio.sleep(self.config.stt_latency + size / self.config.stt_bytes_per_second)
+        return SimpleNamespace(text="I have had an itchy red rash on my cheek for three days.")
+
+
+class StubAsyncGroq:
+    def __init__(self, config: StubConfig):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(config))
+        self.audio = SimpleNamespace(transcriptions=_AsyncTranscriptions(config))
+
+
+# --- ChatGroq ---------------------------------------------------------------
+
+class StubChatGroq(BaseChatModel):
+    """A real LangChain chat model, so ConversationChain and memory accept it"""
+
+    config: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-groq"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self.config.tokens()
+        time.sleep(self.config.llm_latency + len(tokens) / self.config.token_rate)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens).strip()))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.config.llm_latency)
+        for token in self.config.tokens():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            time.sleep(1 / self.config.token_rate)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.config.llm_latency)
+        for token in self.config.tokens():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            await asyncio.sleep(1 / self.config.token_rate)
+
+
+# --- TTS --------------------------------------------------------------------
+
+def _fake_mp3(text: str) -> bytes:
+    # Roughly 1 frame (26 ms) per character, like real speech
+    return MP3_FRAME * max(1, len(text))
+
+
+class StubGTTS:
+    config: StubConfig = None
+
+    def __init__(self, text, lang="en", slow=False, **kwargs):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(self.config.tts_latency)
+        fp.write(_fake_mp3(self.text))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            self.write_to_fp(f)
+
+
+class StubElevenLabs:
+    config: StubConfig = None
+
+    def __init__(self, api_key=None, **kwargs):
+        self.text_to_speech = self
+
+    def convert(self, text, **kwargs) -> Iterator[bytes]:
+        time.sleep(self.config.tts_latency)
+        data = _fake_mp3(text)
+        for start in range(0, len(data), 4096):
+            yield data[start:start + 4096]
+
+
+# --- wiring -----------------------------------------------------------------
+
+def install(config: Optional[StubConfig] = None) -> StubConfig:
+    """Point every backend the app uses at the stubs (call before importing gradio_app)"""
+    config = config or StubConfig()
+    scratch = tempfile.mkdtemp(prefix="ai_doctor_bench_")
+    os.environ.setdefault("GROQ_API_KEY", "stub-key")
+    os.environ.setdefault("ELEVENLABS_API_KEY", "stub-key")
+    os.environ.setdefault("DOCTOR_TTS_ENGINES", "gtts")
+    # Fresh caches, so one run doesn't warm up the next
+    os.environ.setdefault("DOCTOR_TTS_CACHE_DIR", os.path.join(scratch, "tts"))
+    os.environ.setdefault("DOCTOR_DOC_CACHE_DIR", os.path.join(scratch, "docs"))
+    os.environ.setdefault("DOCTOR_AUDIO_DIR", os.path.join(scratch, "audio"))
+
+    import groq_clients
+
+    sync_client = StubGroq(config)
+    async_client = StubAsyncGroq(config)
+    groq_clients.get_groq_client = lambda api_key=None: sync_client
+    groq_clients.get_async_groq_client = lambda api_key=None: async_client
+    groq_clients.get_chat_model = lambda model, api_key=None, **kwargs: StubChatGroq(config=config)
+
+    StubGTTS.config = config
+    StubElevenLabs.config = config
+    import voice_of_the_doctor
+
+    voice_of_the_doctor.gTTS = StubGTTS
+    voice_of_the_doctor.ElevenLabs = StubElevenLabs
+    return config
+
+
+# --- sample inputs ----------------------------------------------------------
+
+def make_wav(path: str, seconds: float = 20.0, rate: int = 44100) -> str:
+    """Stereo 'voice memo': tone bursts with pauses and silence at both ends"""
+    import math
+    import wave
+    import struct
+
+    frames = io.BytesIO()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        speaking = 1.0 < t < seconds - 1.0 and (t % 3.0) < 2.0
+        value = int(8000 * math.sin(2 * math.pi * 220 * t)) if speaking else 0
+        frames.write(struct.pack("<hh", value, value))
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(frames.getvalue())
+    return path
+
+
+def make_image(path: str, size=(3024, 4032)) -> str:
+    """Phone-camera-sized JPEG with enough detail that re-encoding does real work"""
+    from PIL import Image
+
+    image = Image.effect_noise(size, 64).convert("RGB")
+    image.save(path, "JPEG", quality=92)
+    return path
+
+
+def make_pdf(path: str, pages: int = 200, lines_per_page: int = 40) -> str:
+    """Plain text PDF written by hand (no PDF writer dependency)"""
+    line = "Haemoglobin 13.5 g/dL reference 13.0 to 17.0 white cell count 7.2 platelets 250 within normal limits"
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        text = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(
+            f"({line} page {page + 1} line {n + 1}) '" for n in range(lines_per_page)
+        ) + " ET"
+        stream = text.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+    return path
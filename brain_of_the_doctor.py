@@ -5,17 +5,22 @@ GROQ_API_KEY=os.environ.get("GROQ_API_KEY")
 
 #convert image into required format
 #Base64 is an encoding scheme that converts binary data (like an image, audio, or file) into text (a string of characters).
-import base64
 
 # image_path = "acne.jpg"
 
-#function returns a Base64 string version of the image.
+#function returns the image downscaled/re-encoded for the model (see image_pipeline.py):
+#.b64 is the Base64 string, .mime_type the real format (JPEG, or PNG for transparent images).
+#The analyze functions below accept it directly in place of a Base64 string.
+from image_pipeline import PreparedImage, prepare_image
+
 def encode_image(image_path):   
-    image_file=open(image_path, "rb")
-    return base64.b64encode(image_file.read()).decode('utf-8')
+    return prepare_image(image_path)
 
 #setup multimodal LLM
-from groq import Groq
+import hashlib
+from groq_clients import get_groq_client, get_async_groq_client
+from response_cache import response_cache
+from telemetry import atimed_stream, record_bytes, record_tokens, span, timed_stream
 model="llama-3.2-90b-vision-preview"
 
 query="Is there something wrong with my face?"
@@ -24,9 +29,14 @@ query="Is there something wrong with my face?"
 #model = "meta-llama/llama-4-scout-17b-16e-instruct"
 #model="llama-3.2-90b-vision-preview" #Deprecated
 
-def analyze_image_with_query(query, model, encoded_image):
-    client=Groq()  
-    messages=[
+#a plain Base64 string carries no format, so mime_type/image_hash are only used for those
+def _image_fields(encoded_image, mime_type, image_hash):
+    if isinstance(encoded_image, PreparedImage):
+        return encoded_image.b64, encoded_image.mime_type, encoded_image.content_hash
+    return encoded_image, mime_type, image_hash
+
+def build_image_messages(query, encoded_image, mime_type="image/jpeg"):
+    return [
         {
             "role": "user",
             "content": [
@@ -37,14 +47,78 @@ def analyze_image_with_query(query, model, encoded_image):
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{encoded_image}",
+                        "url": f"data:{mime_type};base64,{encoded_image}",
                     },
                 },
             ],
         }]
-    chat_completion=client.chat.completions.create(
-        messages=messages,
-        model=model
+
+#the vision call has no conversation history, so repeat image+query pairs can be
+#answered from the response cache (when DOCTOR_RESPONSE_CACHE=1)
+def image_cache_key(query, model, encoded_image, image_hash=None, use_cache=True):
+    if image_hash is None and response_cache.enabled:
+        image_hash=hashlib.sha256(encoded_image.encode("utf-8")).hexdigest()
+    return response_cache.key(query, model, image_hash=image_hash, use_cache=use_cache)
+
+def analyze_image_with_query(query, model, encoded_image, mime_type="image/jpeg", image_hash=None, use_cache=True):
+    encoded_image, mime_type, image_hash=_image_fields(encoded_image, mime_type, image_hash)
+    cache_key=image_cache_key(query, model, encoded_image, image_hash, use_cache)
+    cached=response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    client=get_groq_client()  
+    messages=build_image_messages(query, encoded_image, mime_type)
+    record_bytes("image_upload", len(encoded_image))
+    with span("vision", model=model) as attrs:
+        chat_completion=client.chat.completions.create(
+            messages=messages,
+            model=model
+        )
+        if getattr(chat_completion, "usage", None):
+            attrs["tokens"]=chat_completion.usage.completion_tokens
+            record_tokens("vision", chat_completion.usage.completion_tokens)
+
+    response=chat_completion.choices[0].message.content
+    response_cache.put(cache_key, response)
+    return response
+
+#same call, but yields the answer token by token as Groq produces it
+def stream_image_analysis(query, model, encoded_image, mime_type="image/jpeg", image_hash=None, use_cache=True):
+    encoded_image, mime_type, image_hash=_image_fields(encoded_image, mime_type, image_hash)
+    cache_key=image_cache_key(query, model, encoded_image, image_hash, use_cache)
+    return timed_stream("vision", response_cache.stream(
+        cache_key, lambda: _stream_image_analysis(query, model, encoded_image, mime_type)
+    ))
+
+def _stream_image_analysis(query, model, encoded_image, mime_type):
+    client=get_groq_client()
+    record_bytes("image_upload", len(encoded_image))
+    stream=client.chat.completions.create(
+        messages=build_image_messages(query, encoded_image, mime_type),
+        model=model,
+        stream=True
     )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
-    return chat_completion.choices[0].message.content
+#async version for the asyncio pipeline
+def astream_image_analysis(query, model, encoded_image, mime_type="image/jpeg", image_hash=None, use_cache=True):
+    encoded_image, mime_type, image_hash=_image_fields(encoded_image, mime_type, image_hash)
+    cache_key=image_cache_key(query, model, encoded_image, image_hash, use_cache)
+    return atimed_stream("vision", response_cache.astream(
+        cache_key, lambda: _astream_image_analysis(query, model, encoded_image, mime_type)
+    ))
+
+async def _astream_image_analysis(query, model, encoded_image, mime_type):
+    client=get_async_groq_client()
+    record_bytes("image_upload", len(encoded_image))
+    stream=await client.chat.completions.create(
+        messages=build_image_messages(query, encoded_image, mime_type),
+        model=model,
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Iterable, Optional, Tuple
+
+
+class LRUCache:
+    """Small thread-safe LRU cache with optional TTL and hit/miss counters"""
+
+    def __init__(self, max_entries: int = 128, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _expired(self, entry: tuple) -> bool:
+        return self.ttl is not None and time.monotonic() - entry[0] > self.ttl
+
+
+def evict_files(
+    paths: Iterable[Path],
+    max_bytes: float,
+    max_age: Optional[float] = None,
+    now: Optional[float] = None,
+) -> Tuple[int, int]:
+    """LRU eviction for on-disk caches: delete the least recently modified files
+    until the rest fit in `max_bytes` (and, with `max_age`, none is older than that).
+
+    Readers bump a file's mtime on use. Returns (files removed, bytes left).
+    """
+    entries = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    now = now if now is not None else time.time()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        expired = max_age is not None and now - mtime > max_age
+        if not expired and total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+            removed += 1
+        except OSError as e:
+            logging.warning(f"Could not delete {path}: {e}")
+    return removed, total
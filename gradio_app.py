@@ -1,23 +1,25 @@
 import os
 import gradio as gr
-from typing import Optional, List, Tuple, Union
+from typing import Optional, List, Tuple, Union, Iterable, Iterator, AsyncIterator
 import time
-import base64
-import json
-from PIL import Image as PILImage
-import io
+import asyncio
+from functools import partial
 from pathlib import Path
 
-# File readers
-from pypdf import PdfReader
-import docx
-from pptx import Presentation
-
 # Import your existing helper functions
-from brain_of_the_doctor import encode_image, analyze_image_with_query
-from voice_of_the_doctor import text_to_speech_with_gtts
-from voice_of_the_patinet import transcribe_with_groq
-from langchain_doctor import DoctorChain
+from brain_of_the_doctor import stream_image_analysis, astream_image_analysis
+from image_pipeline import PreparedImage, prepare_image
+from report_reader import NO_TEXT_MESSAGE, read_error_message, read_pages
+from tts_engines import get_tts_router
+from voice_of_the_patinet import transcribe_with_groq, atranscribe_with_groq
+from audio_preprocessing import preprocess_for_stt
+from session_manager import SessionManager
+from tts_pipeline import SentenceTTSPipeline
+from stage_scheduler import StageScheduler
+from telemetry import metrics, record_bytes, span, start_metrics_server
+from response_cache import response_cache
+from audio_store import AUDIO_CLEANUP_INTERVAL, AUDIO_MAX_AGE
+from tts_cache import get_tts_cache
 
 # System prompt for doctor chain
 SYSTEM_PROMPT = """You have to act as a professional doctor, i know you are not but this is for learning purpose. 
@@ -28,177 +30,428 @@ Donot say 'In the image I see' but say 'With what I see, I think you have ....'
 Dont respond as an AI model in markdown, your answer should mimic that of an actual doctor not an AI bot, 
 Keep your answer concise (max 2 sentences). No preamble, start your answer right away please"""
 
-# -------------------------
-# File reading helper
-# -------------------------
-def read_file_content(file_path: str) -> str:
-    """Extract text from PDF, DOCX, PPTX, TXT, etc."""
-    ext = Path(file_path).suffix.lower()
-    text = ""
-
-    try:
-        if ext == ".pdf":
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                if page.extract_text():
-                    text += page.extract_text() + "\n"
-
-        elif ext == ".docx":
-            doc = docx.Document(file_path)
-            text = "\n".join([para.text for para in doc.paragraphs])
-
-        elif ext == ".pptx":
-            prs = Presentation(file_path)
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
+VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 
-        elif ext in [".txt", ".md", ".csv"]:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
+# Minimum seconds between partial chat updates while the answer streams
+STREAM_UPDATE_INTERVAL = 0.05
 
-        else:
-            return "Unsupported file format."
-
-    except Exception as e:
-        return f"Error reading file: {e}"
-
-    return text.strip() if text else "No readable text found in the file."
+# Serve consultations with the asyncio pipeline (no worker thread held per request)
+ASYNC_PIPELINE = os.environ.get("DOCTOR_ASYNC_PIPELINE", "0") == "1"
+# The async pipeline can interleave many consultations on one event loop
+SEND_CONCURRENCY_LIMIT = None if ASYNC_PIPELINE else "default"
 
 
 class AIDoctor:
-    def __init__(self):
-        self.doctor_chain = DoctorChain()
-        self.conversation_history = []
-
-    def image_to_base64(self, image_path: str) -> str:
-        """Convert image to base64 for HTML display"""
-        try:
-            with open(image_path, "rb") as img_file:
-                img_data = img_file.read()
-                base64_str = base64.b64encode(img_data).decode()
-                return f"data:image/jpeg;base64,{base64_str}"
-        except Exception as e:
-            print(f"Error converting image to base64: {e}")
-            return ""
+    def __init__(self, session_manager: Optional[SessionManager] = None):
+        # ✅ One DoctorChain per browser session instead of one for everybody
+        self.sessions = session_manager or SessionManager()
 
     def process_message(
         self,
         message: str,
-        chat_history_html: str,
         audio_filepath: Optional[str] = None,
         image_filepath: Optional[str] = None,
-        file_filepath: Optional[str] = None
-    ) -> Tuple[str, str, Optional[str]]:
-        """Process user message and return updated HTML chat"""
+        file_filepath: Optional[str] = None,
+        session_id: str = "default"
+    ) -> Iterator[Tuple[str, str, Optional[bytes]]]:
+        """Process user message and stream the HTML of the new turn.
+
+        The browser appends each turn fragment to the chat container, so a
+        request never carries the conversation so far. The fragment is
+        re-sent as tokens arrive so the answer shows up while it is written.
+        """
+        session = self.sessions.get(session_id)
+        with session.lock, span("turn", session=session.session_id):
+            yield from self._process_turn(
+                session, message, audio_filepath, image_filepath, file_filepath
+            )
+            self.sessions.enforce_limits(session)
+
+    def _process_turn(
+        self,
+        session,
+        message: str,
+        audio_filepath: Optional[str],
+        image_filepath: Optional[str],
+        file_filepath: Optional[str]
+    ) -> Iterator[Tuple[str, str, Optional[bytes]]]:
         try:
             user_input = ""
             file_content = ""
             
-            # Handle audio input
-            if audio_filepath:
-                try:
-                    user_input = transcribe_with_groq(
-                        GROQ_API_KEY=os.environ.get("GROQ_API_KEY"),
-                        audio_filepath=audio_filepath,
-                        stt_model="whisper-large-v3"
-                    )
-                    print(f"Transcribed audio: {user_input}")
-                except Exception as e:
-                    print(f"Audio transcription error: {e}")
-                    user_input = message
-            else:
-                user_input = message
+            # ✅ Audio, report and image don't depend on each other: handle them concurrently
+            inputs = self._input_stages(message, audio_filepath, image_filepath, file_filepath).run()
+            user_input = inputs["transcript"]
+            # ✅ Read and encode the image once; the model call and the chat both use it
+            prepared_image = inputs["image"]
 
             if not user_input.strip() and not image_filepath:
-                return "", chat_history_html, None
+                yield "", "", None
+                return
 
             # Handle file input
-            if file_filepath:
-                file_content = read_file_content(file_filepath)
-                #user_input += f"\n\n[Patient uploaded a file, extracted content:]\n{file_text}"
+            with span("report_context"):
+                file_content = self._report_context(session, file_filepath, user_input, inputs["report_pages"])
+            #user_input += f"\n\n[Patient uploaded a file, extracted content:]\n{file_text}"
 
             if not user_input.strip() and not image_filepath and not file_filepath:
-                return "", chat_history_html, None
+                yield "", "", None
+                return
+
+            # Show the patient's message right away, the answer follows as it streams
+            turn_id = session.next_turn_id()
+            with span("render", log=False):
+                user_html = self.build_user_html(user_input, prepared_image, file_filepath)
+            yield "", self.build_turn_html(turn_id, user_html, self.build_ai_html("...")), None
+
+            # Sentences are spoken while the rest of the answer is still streaming
+            speech = SentenceTTSPipeline(self.synthesize_sentence)
+            # (input, answer) saved into memory once the answer has been delivered
+            memory_turn = None
 
             if image_filepath:
                 try:
-                    encoded_image = encode_image(image_filepath)
+                    prepared_image = prepared_image or prepare_image(image_filepath)
                     
-                    query_with_file = SYSTEM_PROMPT + "\nPatient's Query: " + user_input
-                    if file_content:
-                        query_with_file += f"\n\n[Patient uploaded file content:]\n{file_content}"
-
-                    doctor_response = analyze_image_with_query(
-                        #query=SYSTEM_PROMPT + "\nPatient's Query: " + user_input,
-                        query=query_with_file,
-                        encoded_image=encoded_image,
-                        model="meta-llama/llama-4-scout-17b-16e-instruct"
+                    doctor_response = yield from self._stream_response(
+                        turn_id,
+                        speech,
+                        stream_image_analysis(
+                            #query=SYSTEM_PROMPT + "\nPatient's Query: " + user_input,
+                            query=self._image_query(user_input, file_content),
+                            encoded_image=prepared_image,
+                            model=VISION_MODEL,
+                            use_cache=session.use_response_cache
+                        )
                     )
                     print(f"Image analysis response: {doctor_response}")
-
-                    # ✅ Manually save this turn into memory
-                    self.doctor_chain.save_to_memory(user_input, doctor_response)
+                    memory_turn = (user_input, doctor_response)
 
                 except Exception as e:
                     print(f"Image analysis error: {e}")
                     doctor_response = "I couldn't analyze the image properly, please try again."
             else:
                 try:
-                    final_query = f"Patient said: {user_input}"
-                    
-                    if file_content:
-                        final_query += f"\n\n[Patient uploaded file content:]\n{file_content}"
+                    final_query = self._text_query(user_input, file_content)
                     
-                    doctor_response = self.doctor_chain.get_response(query=final_query)
+                    doctor_response = yield from self._stream_response(
+                        turn_id,
+                        speech,
+                        session.doctor_chain.stream_response(query=final_query, use_cache=session.use_response_cache)
+                    )
                     print(f"Doctor response: {doctor_response}")
-
-                    # ✅ Already auto-saves inside get_response,
-                    # but you can call again explicitly if you want:
-                    # self.doctor_chain.save_to_memory(final_query, doctor_response)
+                    memory_turn = (final_query, doctor_response)
 
                 except Exception as e:
                     print(f"Doctor chain error: {e}")
                     doctor_response = "I'm having trouble processing your request at the moment. Please try again."
 
 
-            # Generate audio response
-            audio_output_path = None
-            try:
-                output_path = f"response_{int(time.time())}.mp3"
-                text_to_speech_with_gtts(
-                    input_text=doctor_response,
-                    output_filepath=output_path
-                )
-                audio_output_path = output_path
-                print(f"Generated audio: {audio_output_path}")
-            except Exception as e:
-                print(f"TTS Error: {e}")
-
-            # Build HTML for the new messages
-            new_chat_html = self.build_chat_html(
-                user_input, doctor_response, image_filepath, file_filepath, chat_history_html
-            )
+            turn_html = self._finish_turn(turn_id, doctor_response, speech)
+            yield "", turn_html, None
 
-            return "", new_chat_html, audio_output_path
+            try:
+                # Stream the remaining audio chunks in sentence order
+                for audio_chunk in speech.drain():
+                    print(f"Generated audio: {len(audio_chunk)} bytes")
+                    yield "", turn_html, audio_chunk
+            finally:
+                # ✅ Saved after the answer and its audio went out: summary memory may
+                # call the LLM here, which the patient shouldn't have to wait for
+                if memory_turn:
+                    session.doctor_chain.save_to_memory(*memory_turn)
 
         except Exception as e:
             error_msg = f"Sorry, I encountered an error: {str(e)}"
             print(f"Process message error: {e}")
             
-            new_chat_html = self.build_chat_html(
-                user_input if 'user_input' in locals() else message, 
-                error_msg, 
-                image_filepath, 
-                file_filepath if 'file_filepath' in locals() else None,
-                chat_history_html
+            turn_html = self.build_turn_html(
+                turn_id if 'turn_id' in locals() else session.next_turn_id(),
+                self.build_user_html(
+                    user_input if 'user_input' in locals() else message, 
+                    prepared_image if 'prepared_image' in locals() else None, 
+                    file_filepath if 'file_filepath' in locals() else None
+                ),
+                self.build_ai_html(error_msg)
             )
             
-            return "", new_chat_html, None
+            yield "", turn_html, None
+
+    async def process_message_async(
+        self,
+        message: str,
+        audio_filepath: Optional[str] = None,
+        image_filepath: Optional[str] = None,
+        file_filepath: Optional[str] = None,
+        session_id: str = "default"
+    ) -> AsyncIterator[Tuple[str, str, Optional[bytes]]]:
+        """Async variant of `process_message` with the same outputs.
+
+        Network waits (STT, LLM) use the async Groq/LangChain APIs and
+        blocking work (file parsing, image encoding, TTS) runs in executors,
+        so a consultation does not hold a worker thread while it waits.
+        """
+        session = self.sessions.get(session_id)
+        async with session.async_lock:
+            with span("turn", session=session.session_id):
+                async for update in self._aprocess_turn(
+                    session, message, audio_filepath, image_filepath, file_filepath
+                ):
+                    yield update
+            self.sessions.enforce_limits(session)
+
+    async def _aprocess_turn(
+        self,
+        session,
+        message: str,
+        audio_filepath: Optional[str],
+        image_filepath: Optional[str],
+        file_filepath: Optional[str]
+    ) -> AsyncIterator[Tuple[str, str, Optional[bytes]]]:
+        try:
+            user_input = message
+            inputs = await self._input_stages(
+                message, audio_filepath, image_filepath, file_filepath, use_async=True
+            ).arun()
+            user_input = inputs["transcript"]
+            prepared_image = inputs["image"]
+
+            if not user_input.strip() and not image_filepath:
+                yield "", "", None
+                return
 
-    def build_chat_html(self, user_message: str, ai_response: str, image_path: str, file_path: str, current_html: str) -> str:
-        """Build HTML for chat messages with ChatGPT-like styling"""
+            with span("report_context"):
+                file_content = await asyncio.to_thread(
+                    self._report_context, session, file_filepath, user_input, inputs["report_pages"]
+                )
+
+            turn_id = session.next_turn_id()
+            with span("render", log=False):
+                user_html = self.build_user_html(user_input, prepared_image, file_filepath)
+            yield "", self.build_turn_html(turn_id, user_html, self.build_ai_html("...")), None
+
+            speech = SentenceTTSPipeline(self.synthesize_sentence)
+            parts = []
+            memory_turn = None
+
+            if image_filepath:
+                try:
+                    prepared_image = prepared_image or await asyncio.to_thread(prepare_image, image_filepath)
+                    tokens = astream_image_analysis(
+                        query=self._image_query(user_input, file_content),
+                        encoded_image=prepared_image,
+                        model=VISION_MODEL,
+                        use_cache=session.use_response_cache
+                    )
+                    async for update in self._astream_response(turn_id, speech, tokens, parts):
+                        yield update
+                    doctor_response = "".join(parts).strip()
+                    print(f"Image analysis response: {doctor_response}")
+                    memory_turn = (user_input, doctor_response)
+
+                except Exception as e:
+                    print(f"Image analysis error: {e}")
+                    doctor_response = "I couldn't analyze the image properly, please try again."
+            else:
+                try:
+                    final_query = self._text_query(user_input, file_content)
+                    tokens = session.doctor_chain.astream_response(
+                        query=final_query,
+                        use_cache=session.use_response_cache
+                    )
+                    async for update in self._astream_response(turn_id, speech, tokens, parts):
+                        yield update
+                    doctor_response = "".join(parts).strip()
+                    print(f"Doctor response: {doctor_response}")
+                    memory_turn = (final_query, doctor_response)
+
+                except Exception as e:
+                    print(f"Doctor chain error: {e}")
+                    doctor_response = "I'm having trouble processing your request at the moment. Please try again."
+
+            turn_html = self._finish_turn(turn_id, doctor_response, speech)
+            yield "", turn_html, None
+
+            try:
+                async for audio_chunk in speech.adrain():
+                    print(f"Generated audio: {len(audio_chunk)} bytes")
+                    yield "", turn_html, audio_chunk
+            finally:
+                # Summary memory may call the LLM here, keep it off the event loop
+                if memory_turn:
+                    await asyncio.to_thread(session.doctor_chain.save_to_memory, *memory_turn)
+
+        except Exception as e:
+            error_msg = f"Sorry, I encountered an error: {str(e)}"
+            print(f"Process message error: {e}")
+
+            turn_html = self.build_turn_html(
+                turn_id if 'turn_id' in locals() else session.next_turn_id(),
+                self.build_user_html(
+                    user_input if 'user_input' in locals() else message,
+                    prepared_image if 'prepared_image' in locals() else None,
+                    file_filepath
+                ),
+                self.build_ai_html(error_msg)
+            )
+
+            yield "", turn_html, None
+
+    def _input_stages(
+        self,
+        message: str,
+        audio_filepath: Optional[str],
+        image_filepath: Optional[str],
+        file_filepath: Optional[str],
+        use_async: bool = False
+    ) -> StageScheduler:
+        """Transcription, report extraction and image preprocessing of one turn"""
+        transcribe = self._atranscribe if use_async else self._transcribe
+        return (
+            StageScheduler()
+            .add("transcript", partial(transcribe, message, audio_filepath))
+            .add("report_pages", partial(self._load_report, file_filepath))
+            .add("image", partial(self._load_image, image_filepath))
+        )
+
+    def _transcribe(self, message: str, audio_filepath: Optional[str]) -> str:
+        # Handle audio input
+        if not audio_filepath:
+            return message
+        try:
+            # ✅ Silence trimmed, mono 16 kHz, normalized: smaller upload, faster STT
+            user_input = transcribe_with_groq(
+                GROQ_API_KEY=os.environ.get("GROQ_API_KEY"),
+                audio_filepath=preprocess_for_stt(audio_filepath),
+                stt_model="whisper-large-v3"
+            )
+            print(f"Transcribed audio: {user_input}")
+            return user_input
+        except Exception as e:
+            print(f"Audio transcription error: {e}")
+            return message
+
+    async def _atranscribe(self, message: str, audio_filepath: Optional[str]) -> str:
+        if not audio_filepath:
+            return message
+        try:
+            user_input = await atranscribe_with_groq(
+                GROQ_API_KEY=os.environ.get("GROQ_API_KEY"),
+                audio_filepath=await asyncio.to_thread(preprocess_for_stt, audio_filepath),
+                stt_model="whisper-large-v3"
+            )
+            print(f"Transcribed audio: {user_input}")
+            return user_input
+        except Exception as e:
+            print(f"Audio transcription error: {e}")
+            return message
+
+    def _load_report(self, file_filepath: Optional[str]) -> Union[List[str], str, None]:
+        """Per-page text of the upload, or the error message if it can't be read"""
+        if not file_filepath:
+            return None
+        try:
+            with span("report_extract", file=Path(file_filepath).name):
+                return read_pages(file_filepath)
+        except Exception as e:
+            print(f"Report reading error: {e}")
+            return read_error_message(e)
+
+    def _load_image(self, image_filepath: Optional[str]) -> Optional[PreparedImage]:
+        if not image_filepath:
+            return None
+        try:
+            with span("image_prepare") as attrs:
+                prepared_image = prepare_image(image_filepath)
+                prepared_image.thumbnail_uri  # build the chat preview here too, off the critical path
+                attrs["bytes"] = len(prepared_image.data)
+            return prepared_image
+        except Exception as e:
+            print(f"Image preprocessing error: {e}")
+            return None
+
+    def _report_context(self, session, file_filepath: Optional[str], user_input: str, pages: Union[List[str], str, None]) -> str:
+        """Index a newly uploaded report and return the excerpts relevant to this turn"""
+        if file_filepath:
+            if isinstance(pages, str):
+                # Unreadable: pass the reader's message on to the model (not parsed again)
+                return pages
+            if not pages or not session.report_index.add_document(Path(file_filepath).name, pages):
+                return NO_TEXT_MESSAGE
+
+        # ✅ Only the report excerpts relevant to this question go into the prompt.
+        # The beginning of the report stands in for a vague question on the upload
+        # turn only; later turns that don't match the report get no excerpts at all
+        if len(session.report_index):
+            return session.report_index.context_for(user_input, fallback=bool(file_filepath))
+        return ""
+
+    def _image_query(self, user_input: str, file_content: str) -> str:
+        query_with_file = SYSTEM_PROMPT + "\nPatient's Query: " + user_input
+        if file_content:
+            query_with_file += f"\n\n[Patient uploaded file content:]\n{file_content}"
+        return query_with_file
+
+    def _text_query(self, user_input: str, file_content: str) -> str:
+        final_query = f"Patient said: {user_input}"
+        if file_content:
+            final_query += f"\n\n[Patient uploaded file content:]\n{file_content}"
+        return final_query
+
+    def _finish_turn(self, turn_id: int, doctor_response: str, speech: SentenceTTSPipeline) -> str:
+        """Close the speech pipeline and return the doctor's final bubble"""
+        # Speak the fallback message if the model never produced anything
+        if not speech.submitted:
+            speech.feed(doctor_response)
+        speech.close()
+
+        # Build HTML for the new messages
+        ai_html = self.build_ai_html(doctor_response)
+
+        # The patient's bubble (and its image preview) is already on screen
+        turn_html = self.build_turn_html(turn_id, None, ai_html)
+        record_bytes("turn_html", len(turn_html))
+        return turn_html
+
+    def _stream_response(self, turn_id: int, speech: SentenceTTSPipeline, tokens: Iterable[str]):
+        """Re-render the turn and feed TTS while tokens arrive; returns the full response"""
+        parts = []
+        last_update = 0.0
+        for token in tokens:
+            parts.append(token)
+            speech.feed(token)
+            # Throttle UI updates so fast models don't flood the websocket
+            now = time.monotonic()
+            if now - last_update >= STREAM_UPDATE_INTERVAL:
+                last_update = now
+                partial_html = self.build_turn_html(turn_id, None, self.build_ai_html("".join(parts)))
+                yield "", partial_html, None
+            for audio_chunk in speech.ready():
+                yield "", self.build_turn_html(turn_id, None, self.build_ai_html("".join(parts))), audio_chunk
+        return "".join(parts).strip()
+
+    async def _astream_response(self, turn_id: int, speech: SentenceTTSPipeline, tokens: AsyncIterator[str], parts: List[str]):
+        """Async `_stream_response`; the response accumulates in `parts`"""
+        last_update = 0.0
+        async for token in tokens:
+            parts.append(token)
+            speech.feed(token)
+            now = time.monotonic()
+            if now - last_update >= STREAM_UPDATE_INTERVAL:
+                last_update = now
+                yield "", self.build_turn_html(turn_id, None, self.build_ai_html("".join(parts))), None
+            for audio_chunk in speech.ready():
+                yield "", self.build_turn_html(turn_id, None, self.build_ai_html("".join(parts))), audio_chunk
+
+    def synthesize_sentence(self, sentence: str) -> bytes:
+        """TTS for one sentence of a streamed answer (runs in the TTS worker pool)"""
+        # ✅ Served straight from the TTS cache when this sentence was spoken before
+        # ✅ MP3 bytes, handed to the streaming gr.Audio without a temp file
+        # ✅ Engine picked by DOCTOR_TTS_ENGINES, falls back on errors/slow engines
+        return get_tts_router().speak(sentence)
+
+    def build_user_html(self, user_message: str, image: Optional[PreparedImage], file_path: str) -> str:
+        """Build HTML for the patient's message with ChatGPT-like styling"""
         
         # ✅ NEW: File display logic
         file_html = ""
@@ -228,18 +481,19 @@ class AIDoctor:
             """
         
         # User message HTML
-        user_html = f"""
+        return f"""
         <div class="message user-message">
             <div class="message-content">
-                {"<img src='" + self.image_to_base64(image_path) + "' class='message-image'>" if image_path else ""}
+                {"<img src='" + image.thumbnail_uri + "' class='message-image'>" if image else ""}
                 {file_html}
                 <div class="message-text">{user_message}</div>
             </div>
         </div>
         """
-        
-        # AI response HTML
-        ai_html = f"""
+
+    def build_ai_html(self, ai_response: str) -> str:
+        """Build HTML for the doctor's reply"""
+        return f"""
         <div class="message ai-message">
             <div class="avatar">🩺</div>
             <div class="message-content">
@@ -247,15 +501,55 @@ class AIDoctor:
             </div>
         </div>
         """
-        
-        return current_html + user_html + ai_html
 
-    def clear_conversation(self):
-        """Clear the conversation"""
-        self.doctor_chain = DoctorChain()
+    def build_turn_html(self, turn_id: int, user_html: Optional[str], ai_html: str) -> str:
+        """Wrap one user/AI exchange so the browser can append or update it.
+
+        Pass `user_html=None` to send only the doctor's bubble, e.g. while the
+        answer streams, so the patient's message is not re-sent every update.
+        """
+        # The ids let the browser replace a bubble that is re-sent instead of duplicating it
+        ai_part = f'<div class="chat-turn" id="turn-{turn_id}-ai">{ai_html}</div>'
+        if user_html is None:
+            return ai_part
+        return f'<div class="chat-turn" id="turn-{turn_id}-user">{user_html}</div>' + ai_part
+
+    def clear_conversation(self, session_id: str = "default"):
+        """Clear the conversation of this session only"""
+        self.sessions.reset(session_id)
         return "", ""
 
 
+GREETING_HTML = """
+                <div class="message ai-message">
+                    <div class="avatar">🩺</div>
+                    <div class="message-content">
+                        <div class="message-text">Hello! I'm your AI medical consultant. You can ask me questions about health concerns and upload medical images for analysis. How can I help you today?</div>
+                    </div>
+                </div>
+"""
+
+# Appends (or replaces, while a turn is still being updated) the bubbles of a turn
+APPEND_TURN_JS = """
+(turn_html) => {
+    if (!turn_html) return;
+    const container = document.getElementById('chat-container');
+    if (!container) return;
+    const holder = document.createElement('div');
+    holder.innerHTML = turn_html;
+    for (const turn of Array.from(holder.children)) {
+        // Only look inside the chat: the hidden #turn_buffer holds a copy with the same id
+        const existing = turn.id ? container.querySelector('#' + CSS.escape(turn.id)) : null;
+        if (existing) {
+            existing.replaceWith(turn);
+        } else {
+            container.appendChild(turn);
+        }
+    }
+}
+"""
+
+
 def create_interface():
     """Create ChatGPT-like interface using HTML"""
     
@@ -441,6 +735,10 @@ def create_interface():
             background-color: #555;
             border-color: #666;
         }
+        
+        #turn_buffer {
+            display: none !important;
+        }
     </style>
     """
     
@@ -454,7 +752,9 @@ def create_interface():
             border_color_primary='#2d2d2d',
             border_color_primary_dark='#2d2d2d'
         ),
-        css=custom_css
+        css=custom_css,
+        # ✅ Gradio keeps its own copy of every audio file it serves; expire those too
+        delete_cache=(int(AUDIO_CLEANUP_INTERVAL), int(AUDIO_MAX_AGE))
     ) as interface:
         
         gr.Markdown(
@@ -465,20 +765,18 @@ def create_interface():
         )
         
         # Chat display area
+        # The chat is rendered once here and then only grows in the browser;
+        # it is never sent back to the server.
         chat_html = gr.HTML(
             value=f"""
             {custom_css}
-            <div class="chat-container" id="chat-container">
-                <div class="message ai-message">
-                    <div class="avatar">🩺</div>
-                    <div class="message-content">
-                        <div class="message-text">Hello! I'm your AI medical consultant. You can ask me questions about health concerns and upload medical images for analysis. How can I help you today?</div>
-                    </div>
-                </div>
-            </div>
+            <div class="chat-container" id="chat-container">{GREETING_HTML}</div>
             """,
             elem_id="chat_display"
         )
+
+        # Carries just the latest turn; APPEND_TURN_JS moves it into the chat
+        turn_html = gr.HTML(value="", elem_id="turn_buffer")
         
         with gr.Row():
             with gr.Column(scale=3):
@@ -515,7 +813,9 @@ def create_interface():
                 gr.Markdown("### 🔊 Audio Response")
                 audio_output = gr.Audio(
                     label="Doctor's Voice Response",
-                    autoplay=True
+                    autoplay=True,
+                    streaming=True,
+                    format="mp3"
                 )
                 
                 gr.Markdown(
@@ -532,37 +832,42 @@ def create_interface():
                 )
         
         # Event handlers
-        def handle_send(message, current_html, audio, image, file):
-            return ai_doctor.process_message(message, current_html, audio, image, file)
+        def handle_send(message, audio, image, file, request: gr.Request):
+            yield from ai_doctor.process_message(
+                message, audio, image, file, session_id=request.session_hash
+            )
+
+        async def handle_send_async(message, audio, image, file, request: gr.Request):
+            async for update in ai_doctor.process_message_async(
+                message, audio, image, file, session_id=request.session_hash
+            ):
+                yield update
+
+        send_handler = handle_send_async if ASYNC_PIPELINE else handle_send
         
-        def handle_clear():
-            result = ai_doctor.clear_conversation()
-            return result[0], f"""
+        def handle_clear(request: gr.Request):
+            result = ai_doctor.clear_conversation(session_id=request.session_hash)
+            return result[0], result[1], f"""
             {custom_css}
-            <div class="chat-container" id="chat-container">
-                <div class="message ai-message">
-                    <div class="avatar">🩺</div>
-                    <div class="message-content">
-                        <div class="message-text">Hello! I'm your AI medical consultant. You can ask me questions about health concerns and upload medical images for analysis. How can I help you today?</div>
-                    </div>
-                </div>
-            </div>
+            <div class="chat-container" id="chat-container">{GREETING_HTML}</div>
             """
         
         # Bind events
         send_btn.click(
-            fn=handle_send,
-            inputs=[message_input, chat_html, audio_input, image_input,file_input],
-            outputs=[message_input, chat_html, audio_output]
+            fn=send_handler,
+            concurrency_limit=SEND_CONCURRENCY_LIMIT,
+            inputs=[message_input, audio_input, image_input, file_input],
+            outputs=[message_input, turn_html, audio_output]
         ).then(
             lambda: [None, None, None],
             outputs=[audio_input, image_input, file_input]
         )
         
         message_input.submit(
-            fn=handle_send,
-            inputs=[message_input, chat_html, audio_input, image_input, file_input],
-            outputs=[message_input, chat_html, audio_output]
+            fn=send_handler,
+            concurrency_limit=SEND_CONCURRENCY_LIMIT,
+            inputs=[message_input, audio_input, image_input, file_input],
+            outputs=[message_input, turn_html, audio_output]
         ).then(
             lambda: [None, None, None],
             outputs=[audio_input, image_input, file_input]
@@ -570,8 +875,11 @@ def create_interface():
         
         clear_btn.click(
             fn=handle_clear,
-            outputs=[audio_output, chat_html]
+            outputs=[audio_output, turn_html, chat_html]
         )
+
+        # Append each new turn client-side instead of re-sending the whole chat
+        turn_html.change(None, inputs=[turn_html], outputs=None, js=APPEND_TURN_JS)
         
         # Auto-scroll JavaScript
         interface.load(
@@ -604,6 +912,12 @@ if __name__ == "__main__":
         print("✅ GROQ_API_KEY: Set")
     
     interface = create_interface()
+
+    # ✅ Per-stage latency/TTFT histograms plus cache stats at /metrics (DOCTOR_METRICS_PORT)
+    metrics.register_gauges("doctor_response_cache", response_cache.stats)
+    metrics.register_gauges("doctor_tts_cache", lambda: get_tts_cache().stats())
+    metrics.register_gauges("doctor_tts_router", lambda: get_tts_router().stats())
+    start_metrics_server()
     interface.launch(
         debug=True,
         show_error=True,
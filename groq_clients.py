@@ -0,0 +1,101 @@
+#Shared, long-lived Groq clients
+#Creating Groq()/ChatGroq per request opens a new connection pool (and TLS handshake)
+#every time; these registries hand out one keep-alive pooled client per API key instead.
+#httpx clients are safe to use from many threads at once.
+import os
+import threading
+from typing import Optional
+
+import httpx
+from groq import Groq, AsyncGroq
+from langchain_groq import ChatGroq
+
+GROQ_MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "100"))
+GROQ_MAX_KEEPALIVE = int(os.environ.get("GROQ_MAX_KEEPALIVE", "20"))
+GROQ_KEEPALIVE_EXPIRY = float(os.environ.get("GROQ_KEEPALIVE_EXPIRY", "60"))
+GROQ_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_http_clients = {}
+_clients = {}
+_chat_models = {}
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=GROQ_MAX_CONNECTIONS,
+        max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+    )
+
+
+def _api_key(api_key: Optional[str]) -> Optional[str]:
+    return api_key or os.environ.get("GROQ_API_KEY")
+
+
+def _http_client(kind: str):
+    # One pooled transport per kind, shared by every Groq/ChatGroq client
+    client = _http_clients.get(kind)
+    if client is None:
+        if kind == "async":
+            client = httpx.AsyncClient(limits=_pool_limits(), timeout=GROQ_TIMEOUT)
+        else:
+            client = httpx.Client(limits=_pool_limits(), timeout=GROQ_TIMEOUT)
+        _http_clients[kind] = client
+    return client
+
+
+def get_groq_client(api_key: Optional[str] = None) -> Groq:
+    """Shared synchronous Groq client for `api_key` (defaults to GROQ_API_KEY)"""
+    key = _api_key(api_key)
+    with _lock:
+        client = _clients.get(("sync", key))
+        if client is None:
+            client = Groq(api_key=key, http_client=_http_client("sync"))
+            _clients[("sync", key)] = client
+        return client
+
+
+def get_async_groq_client(api_key: Optional[str] = None) -> AsyncGroq:
+    """Shared AsyncGroq client (use from the server's event loop)"""
+    key = _api_key(api_key)
+    with _lock:
+        client = _clients.get(("async", key))
+        if client is None:
+            client = AsyncGroq(api_key=key, http_client=_http_client("async"))
+            _clients[("async", key)] = client
+        return client
+
+
+def get_chat_model(model: str, api_key: Optional[str] = None, **kwargs) -> ChatGroq:
+    """Shared ChatGroq for a model/settings combination.
+
+    ChatGroq keeps no conversation state, so one instance can serve every
+    session; memory lives in each session's DoctorChain.
+    """
+    key = _api_key(api_key)
+    cache_key = (model, key, tuple(sorted(kwargs.items())))
+    with _lock:
+        chat = _chat_models.get(cache_key)
+        if chat is None:
+            chat = ChatGroq(
+                api_key=key,
+                model=model,
+                http_client=_http_client("sync"),
+                http_async_client=_http_client("async"),
+                **kwargs
+            )
+            _chat_models[cache_key] = chat
+        return chat
+
+
+def close_all() -> None:
+    """Close the pooled connections (e.g. on shutdown or in benchmarks)"""
+    with _lock:
+        sync_client = _http_clients.pop("sync", None)
+        if sync_client is not None:
+            sync_client.close()
+        # The async transport is closed by its event loop on shutdown
+        _http_clients.clear()
+        _clients.clear()
+        _chat_models.clear()
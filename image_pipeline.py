@@ -0,0 +1,142 @@
+#Image preprocessing before the vision call:
+#fix EXIF orientation, downscale, re-encode within a byte budget and cache by content hash
+import os
+import io
+import base64
+import hashlib
+import logging
+import mimetypes
+
+from PIL import Image, ImageOps
+
+from caching import LRUCache
+
+try:
+    # HEIC/HEIF phone photos need the optional pillow-heif plugin
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+MAX_IMAGE_DIM = int(os.environ.get("DOCTOR_MAX_IMAGE_DIM", "1568"))
+MAX_IMAGE_BYTES = int(os.environ.get("DOCTOR_MAX_IMAGE_BYTES", "1500000"))
+IMAGE_CACHE_ENTRIES = int(os.environ.get("DOCTOR_IMAGE_CACHE_ENTRIES", "64"))
+# Chat bubbles show a small preview instead of the full image
+THUMBNAIL_DIM = int(os.environ.get("DOCTOR_THUMBNAIL_DIM", "400"))
+
+JPEG_QUALITIES = (85, 75, 65, 50)
+
+_image_cache = LRUCache(max_entries=IMAGE_CACHE_ENTRIES)
+# (path, mtime, size) -> content hash, so the same upload is only read once
+_path_index = LRUCache(max_entries=IMAGE_CACHE_ENTRIES * 4)
+
+
+class PreparedImage:
+    """An uploaded image re-encoded for the model, with its real MIME type.
+
+    One instance is shared by everything that needs the upload in a turn
+    (the vision call and the chat preview), so the file is read once.
+    """
+
+    def __init__(self, data: bytes, mime_type: str, size: tuple, content_hash: str):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+        self.content_hash = content_hash
+        self._b64 = None
+        self._thumbnail_uri = None
+
+    @property
+    def b64(self) -> str:
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.data).decode("utf-8")
+        return self._b64
+
+    @property
+    def data_uri(self) -> str:
+        return f"data:{self.mime_type};base64,{self.b64}"
+
+    @property
+    def thumbnail_uri(self) -> str:
+        """Small JPEG data URI for displaying the image in the chat"""
+        if self._thumbnail_uri is None:
+            try:
+                image = Image.open(io.BytesIO(self.data))
+                image.thumbnail((THUMBNAIL_DIM, THUMBNAIL_DIM), Image.LANCZOS)
+                if image.mode != "RGB":
+                    image = _flatten(image)
+                data = _encode(image, "JPEG", quality=70, optimize=True)
+                self._thumbnail_uri = "data:image/jpeg;base64," + base64.b64encode(data).decode("utf-8")
+            except Exception as e:
+                logging.warning(f"Could not build thumbnail: {e}")
+                self._thumbnail_uri = self.data_uri
+        return self._thumbnail_uri
+
+
+def prepare_image(image_path: str) -> PreparedImage:
+    """Read, normalize and encode an image once; repeat uploads hit the cache"""
+    stat = os.stat(image_path)
+    path_key = (os.path.realpath(image_path), stat.st_mtime_ns, stat.st_size)
+    content_hash = _path_index.get(path_key)
+    if content_hash is not None:
+        prepared = _image_cache.get(content_hash)
+        if prepared is not None:
+            return prepared
+
+    with open(image_path, "rb") as image_file:
+        raw = image_file.read()
+
+    content_hash = hashlib.sha256(raw).hexdigest()
+    _path_index.put(path_key, content_hash)
+    prepared = _image_cache.get(content_hash)
+    if prepared is None:
+        prepared = _preprocess(raw, image_path, content_hash)
+        _image_cache.put(content_hash, prepared)
+    return prepared
+
+
+def _preprocess(raw: bytes, image_path: str, content_hash: str) -> PreparedImage:
+    try:
+        image = Image.open(io.BytesIO(raw))
+        source_format = image.format
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        # Unknown format: send it untouched rather than failing the consultation
+        logging.warning(f"Could not preprocess {image_path}, sending original: {e}")
+        mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+        return PreparedImage(raw, mime_type, (0, 0), content_hash)
+
+    image.thumbnail((MAX_IMAGE_DIM, MAX_IMAGE_DIM), Image.LANCZOS)
+
+    # Keep PNG for images with transparency, JPEG for photos
+    if image.mode in ("RGBA", "LA", "P") and source_format != "JPEG":
+        data = _encode(image, "PNG")
+        if len(data) <= MAX_IMAGE_BYTES:
+            return PreparedImage(data, "image/png", image.size, content_hash)
+        image = _flatten(image)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Lower the quality first, then the resolution, until the budget is met
+    while True:
+        for quality in JPEG_QUALITIES:
+            data = _encode(image, "JPEG", quality=quality, optimize=True)
+            if len(data) <= MAX_IMAGE_BYTES:
+                return PreparedImage(data, "image/jpeg", image.size, content_hash)
+        if min(image.size) < 64:
+            return PreparedImage(data, "image/jpeg", image.size, content_hash)
+        image = image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.LANCZOS)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.split()[-1])
+    return background
+
+
+def _encode(image: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
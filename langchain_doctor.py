@@ -1,27 +1,70 @@
-from langchain_groq import ChatGroq
 from langchain.prompts import ChatPromptTemplate
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferMemory, ConversationSummaryBufferMemory
 from langchain.chains import ConversationChain
-from langchain.callbacks import StreamingStdOutCallbackHandler
+from typing import AsyncIterator, Iterator
 import os
 
+from groq_clients import get_chat_model
+from response_cache import response_cache
+from telemetry import atimed_stream, record_bytes, span, timed_stream
 
-class DoctorChain:
-    def __init__(self):
-        # ✅ Use correct Groq endpoint & model
-        self.chat = ChatGroq(
-            api_key=os.environ.get("GROQ_API_KEY"),
-            model="llama-3.3-70b-versatile",  # safer, supported model
-            streaming=True,
-            callbacks=[StreamingStdOutCallbackHandler()]
+# Memory settings: "buffer" keeps every turn, "summary" keeps the recent turns
+# verbatim within a token budget and folds older ones into a running summary
+MEMORY_MODE = os.environ.get("DOCTOR_MEMORY_MODE", "buffer")
+MEMORY_TOKEN_BUDGET = int(os.environ.get("DOCTOR_MEMORY_TOKEN_BUDGET", "1500"))
+SUMMARY_MODEL = os.environ.get("DOCTOR_SUMMARY_MODEL", "llama-3.1-8b-instant")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+class TokenBudgetSummaryMemory(ConversationSummaryBufferMemory):
+    """Summary buffer memory that counts tokens without a tokenizer download"""
+
+    # Once over budget, the buffer is summarized down to this share of it, so
+    # the summary LLM runs every few turns instead of on every turn
+    prune_ratio: float = 0.5
+
+    def buffer_tokens(self) -> int:
+        return sum(estimate_tokens(str(m.content)) for m in self.chat_memory.messages)
+
+    def prune(self) -> None:
+        """Roll the oldest messages into the summary once over budget"""
+        buffer = self.chat_memory.messages
+        if self.buffer_tokens() <= self.max_token_limit:
+            return
+        pruned_memory = []
+        target = int(self.max_token_limit * self.prune_ratio)
+        while buffer and self.buffer_tokens() > target:
+            pruned_memory.append(buffer.pop(0))
+        self.moving_summary_buffer = self.predict_new_summary(
+            pruned_memory, self.moving_summary_buffer
         )
 
+
+class DoctorChain:
+    def __init__(self, memory_mode: str = MEMORY_MODE, max_token_limit: int = MEMORY_TOKEN_BUDGET):
+        # ✅ Use correct Groq endpoint & model (shared pooled client, not one per session)
+        self.model_name = "llama-3.3-70b-versatile"  # safer, supported model
+        self.chat = get_chat_model(self.model_name, streaming=True)
+
         # ✅ Ensure memory matches prompt variables
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            input_key="input",
-            return_messages=True
-        )
+        if memory_mode == "summary":
+            self.memory = TokenBudgetSummaryMemory(
+                llm=get_chat_model(SUMMARY_MODEL, temperature=0),
+                max_token_limit=max_token_limit,
+                memory_key="chat_history",
+                input_key="input",
+                return_messages=True
+            )
+        else:
+            self.memory = ConversationBufferMemory(
+                memory_key="chat_history",
+                input_key="input",
+                return_messages=True
+            )
 
         # ✅ Prompt with history + current input
         self.prompt = ChatPromptTemplate.from_messages([
@@ -51,15 +94,67 @@ Keep your answer concise (max 2 sentences). No preamble, start your answer right
         else:
             full_query = query
 
-        response = self.chain.predict(input=full_query)
+        with span("llm", model=self.model_name):
+            response = self.chain.predict(input=full_query)
         return response.strip()
+
+    def _cache_key(self, query: str, use_cache: bool):
+        # Once there is history the answer depends on it, so only first turns are cached
+        stateless = not self.memory.chat_memory.messages and not getattr(self.memory, "moving_summary_buffer", "")
+        return response_cache.key(query, self.model_name, use_cache=use_cache and stateless)
+
+    def stream_response(self, query: str, use_cache: bool = True) -> Iterator[str]:
+        """Yield the response token by token (the caller saves the turn with `save_to_memory`)"""
+        history = self.memory.load_memory_variables({})["chat_history"]
+        messages = self.prompt.format_messages(chat_history=history, input=query)
+
+        def model_stream():
+            for chunk in self.chat.stream(messages):
+                if chunk.content:
+                    yield chunk.content
+
+        record_bytes("llm_prompt", sum(len(m.content) for m in messages))
+        # ✅ TTFT/tokens as the patient sees them (a cache hit counts too)
+        yield from timed_stream("llm", response_cache.stream(self._cache_key(query, use_cache), model_stream))
+
+    async def astream_response(self, query: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Async `stream_response` built on ChatGroq.astream"""
+        history = self.memory.load_memory_variables({})["chat_history"]
+        messages = self.prompt.format_messages(chat_history=history, input=query)
+
+        async def model_stream():
+            async for chunk in self.chat.astream(messages):
+                if chunk.content:
+                    yield chunk.content
+
+        record_bytes("llm_prompt", sum(len(m.content) for m in messages))
+        async for token in atimed_stream("llm", response_cache.astream(self._cache_key(query, use_cache), model_stream)):
+            yield token
     
     def save_to_memory(self, user_input: str, ai_output: str):
         """Manually save conversation turns into memory"""
-        self.memory.save_context(
-            {"input": user_input},
-            {"output": ai_output}
-        )
+        # summary memory may call the LLM here
+        with span("memory_save", log=False):
+            self.memory.save_context(
+                {"input": user_input},
+                {"output": ai_output}
+            )
+
+    def memory_chars(self) -> int:
+        """Approximate size of the stored history in characters"""
+        summary = getattr(self.memory, "moving_summary_buffer", "")
+        return len(summary) + sum(len(str(m.content)) for m in self.memory.chat_memory.messages)
+
+    def trim_memory(self, max_chars: int):
+        """Drop the oldest turns until the history fits in `max_chars`"""
+        messages = self.memory.chat_memory.messages
+        total = self.memory_chars()
+        # Always keep the latest exchange so follow-up questions still work
+        while total > max_chars and len(messages) > 2:
+            # Whole exchanges only, so the history never starts with an orphaned reply
+            total -= len(str(messages.pop(0).content))
+            while len(messages) > 2 and messages[0].type != "human":
+                total -= len(str(messages.pop(0).content))
 
 
 # from langchain_groq import ChatGroq
@@ -0,0 +1,158 @@
+#Retrieval over uploaded reports: chunk the extracted text, index it with BM25
+#and hand the model only the chunks relevant to the patient's question
+import os
+import re
+import math
+import logging
+from collections import Counter, defaultdict
+from typing import List, Tuple
+
+CHUNK_CHARS = int(os.environ.get("DOCTOR_REPORT_CHUNK_CHARS", "800"))
+CHUNK_OVERLAP = int(os.environ.get("DOCTOR_REPORT_CHUNK_OVERLAP", "120"))
+REPORT_TOP_K = int(os.environ.get("DOCTOR_REPORT_TOP_K", "4"))
+# Chunks scoring below this share of the best chunk's score are left out. BM25
+# scores depend on the report's size, so the cutoff is relative, not absolute
+REPORT_MIN_RELATIVE_SCORE = float(os.environ.get("DOCTOR_REPORT_MIN_RELATIVE_SCORE", "0.3"))
+# Per-session cap; the oldest reports are dropped first (150 chunks is ~120 KB of text)
+MAX_INDEXED_CHUNKS = int(os.environ.get("DOCTOR_REPORT_MAX_CHUNKS", "150"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Question words that would otherwise "match" any report ("is my ... ok?")
+STOPWORDS = frozenset(
+    "a an and are am be can could do does did for from have has how i in is it its me my "
+    "of on or our should so that the their them there these they this to us was we what "
+    "when where which who why will with would you your ok okay".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into ~chunk_chars pieces on word boundaries, with some overlap"""
+    chunks = []
+    current, size, fresh = [], 0, False
+    for word in text.split():
+        current.append(word)
+        size += len(word) + 1
+        fresh = True
+        if size >= chunk_chars:
+            chunks.append(" ".join(current))
+            # Carry the tail over so a sentence cut in two is still findable
+            tail, tail_size = [], 0
+            while current and tail_size < overlap:
+                word = current.pop()
+                tail.insert(0, word)
+                tail_size += len(word) + 1
+            current, size, fresh = tail, tail_size, False
+    if current and fresh:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class ReportIndex:
+    """BM25 index over the chunks of the reports uploaded in one session"""
+
+    def __init__(self, max_chunks: int = MAX_INDEXED_CHUNKS, min_relative_score: float = REPORT_MIN_RELATIVE_SCORE, k1: float = 1.5, b: float = 0.75):
+        self.max_chunks = max_chunks
+        self.min_relative_score = min_relative_score
+        self.k1 = k1
+        self.b = b
+        self._documents: List[Tuple[str, List[Tuple[str, str]]]] = []
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def text_chars(self) -> int:
+        """Characters of indexed chunk text (the postings grow with it)"""
+        return self._chars
+
+    def trim(self, max_chars: int) -> None:
+        """Drop the oldest reports, then the end of the newest, until the text fits in `max_chars`"""
+        if self._chars <= max_chars:
+            return
+        while len(self._documents) > 1 and sum(_chars(c) for _, c in self._documents) > max_chars:
+            self._documents.pop(0)
+        if self._documents and _chars(self._documents[0][1]) > max_chars:
+            name, chunks = self._documents[0]
+            kept, used = [], 0
+            for chunk in chunks:
+                used += len(chunk[1])
+                if used > max_chars:
+                    break
+                kept.append(chunk)
+            logging.warning(f"Report {name} trimmed to {len(kept)} of {len(chunks)} chunks to fit the session budget")
+            self._documents[0] = (name, kept)
+        self._rebuild()
+
+    def add_document(self, name: str, pages: List[str]) -> int:
+        """Index a report given its per-page text; returns the number of chunks"""
+        chunks = []
+        for page_number, page in enumerate(pages, start=1):
+            source = f"{name}, page {page_number}" if len(pages) > 1 else name
+            chunks.extend((source, chunk) for chunk in chunk_text(page))
+        if not chunks:
+            return 0
+        if len(chunks) > self.max_chunks:
+            logging.warning(
+                f"Report {name} has {len(chunks)} chunks, only the first {self.max_chunks} are indexed "
+                f"(raise DOCTOR_REPORT_MAX_CHUNKS or DOCTOR_REPORT_CHUNK_CHARS)"
+            )
+            chunks = chunks[:self.max_chunks]
+
+        # Re-uploading the same report replaces the old copy
+        self._documents = [doc for doc in self._documents if doc[0] != name]
+        self._documents.append((name, chunks))
+        while len(self._documents) > 1 and sum(len(c) for _, c in self._documents) > self.max_chunks:
+            self._documents.pop(0)
+        self._rebuild()
+        return len(chunks)
+
+    def search(self, query: str, k: int = REPORT_TOP_K, fallback: bool = False) -> List[Tuple[str, str]]:
+        """Return the (source, chunk) pairs that best match `query`, in document order.
+
+        With `fallback`, a query that matches nothing gets the first `k` chunks.
+        """
+        scores = defaultdict(float)
+        n = len(self._chunks)
+        for term in set(tokenize(query)) - STOPWORDS:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                norm = 1 - self.b + self.b * self._lengths[chunk_id] / self._avg_length
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+        cutoff = max(scores.values(), default=0.0) * self.min_relative_score
+        matches = [chunk_id for chunk_id, score in scores.items() if score > 0 and score >= cutoff]
+        if matches:
+            best = sorted(matches, key=scores.get, reverse=True)[:k]
+        elif fallback:
+            # Nothing matched (e.g. "what does my report say?"): use the beginning
+            best = range(min(k, n))
+        else:
+            best = []
+        return [self._chunks[i] for i in sorted(best)]
+
+    def context_for(self, query: str, k: int = REPORT_TOP_K, fallback: bool = False) -> str:
+        """Relevant report excerpts formatted for the prompt (empty if nothing matches)"""
+        return "\n\n".join(f"({source}) {chunk}" for source, chunk in self.search(query, k, fallback))
+
+    def _rebuild(self) -> None:
+        self._chunks = [chunk for _, chunks in self._documents for chunk in chunks]
+        self._chars = _chars(self._chunks)
+        self._postings = defaultdict(list)
+        self._lengths = []
+        for chunk_id, (_, chunk) in enumerate(self._chunks):
+            counts = Counter(tokenize(chunk))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((chunk_id, tf))
+        self._avg_length = max(sum(self._lengths) / len(self._lengths), 1.0) if self._lengths else 1.0
+
+
+def _chars(chunks: List[Tuple[str, str]]) -> int:
+    return sum(len(chunk) for _, chunk in chunks)
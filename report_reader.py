@@ -0,0 +1,283 @@
+#Text extraction for uploaded reports (PDF, DOCX, PPTX, TXT, ...)
+#Lab reports get re-uploaded a lot, so extracted pages are cached by content hash
+#in memory and, optionally, on disk (set DOCTOR_DOC_CACHE_DIR)
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+# File readers
+from pypdf import PdfReader
+import docx
+from pptx import Presentation
+
+from caching import LRUCache, evict_files
+
+DOC_CACHE_ENTRIES = int(os.environ.get("DOCTOR_DOC_CACHE_ENTRIES", "32"))
+DOC_CACHE_DIR = os.environ.get("DOCTOR_DOC_CACHE_DIR")
+DOC_CACHE_MAX_BYTES = int(os.environ.get("DOCTOR_DOC_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Large PDFs are split into page ranges and extracted in a process pool
+PDF_WORKERS = int(os.environ.get("DOCTOR_PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("DOCTOR_PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_PAGES_PER_TASK = int(os.environ.get("DOCTOR_PDF_PAGES_PER_TASK", "8"))
+# Seconds to wait for one page range before giving up on the document
+PDF_TASK_TIMEOUT = float(os.environ.get("DOCTOR_PDF_TASK_TIMEOUT", "60"))
+
+TEXT_EXTENSIONS = [".txt", ".md", ".csv"]
+SUPPORTED_EXTENSIONS = [".pdf", ".docx", ".pptx"] + TEXT_EXTENSIONS
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+class DiskDocumentStore:
+    """On-disk store of extracted pages with size-based LRU eviction"""
+
+    def __init__(self, root: str, max_bytes: int = DOC_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> Optional[List[str]]:
+        path = self.root / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pages = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Bump mtime so eviction drops the least recently used documents first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return pages
+
+    def put(self, key: str, pages: List[str]) -> None:
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, self.root / f"{key}.json")
+        self.evict()
+
+    def evict(self) -> None:
+        evict_files(self.root.glob("*.json"), self.max_bytes)
+
+
+_memory_cache = LRUCache(max_entries=DOC_CACHE_ENTRIES)
+# (path, mtime, size) -> cache key, so an unchanged file is not re-hashed
+_path_index = LRUCache(max_entries=DOC_CACHE_ENTRIES * 4)
+_disk_store = DiskDocumentStore(DOC_CACHE_DIR) if DOC_CACHE_DIR else None
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Forking the threaded server could copy locks held by other threads
+            # into the child; forkserver/spawn start workers from a clean process
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pdf_pool
+
+
+def _discard_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Stop a pool with a stuck worker and kill its processes; the next PDF gets a fresh one"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    if hasattr(pool, "terminate_workers"):  # Python 3.14+
+        pool.terminate_workers()
+        return
+    # shutdown() alone leaves a busy worker running, so terminate the processes too
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _extract_pdf_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Worker: extract pages [start, stop) of a PDF (runs in a child process)"""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _within_budget(pages: Iterable[str], char_budget: Optional[int]) -> Iterator[str]:
+    used = 0
+    for page in pages:
+        yield page
+        used += len(page)
+        if char_budget is not None and used >= char_budget:
+            return
+
+
+def iter_pdf_pages(file_path: str, char_budget: Optional[int] = None, max_workers: int = PDF_WORKERS) -> Iterator[str]:
+    """Yield the text of each PDF page in order.
+
+    Long documents are extracted in page ranges by a process pool, with only
+    a few ranges in flight at a time, so a 200-page report uses every core
+    without being held in memory at once. Extraction stops as soon as
+    `char_budget` characters have been produced.
+    """
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    if max_workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        yield from _within_budget((page.extract_text() or "" for page in reader.pages), char_budget)
+        return
+
+    pool = _get_pdf_pool()
+    ranges = iter([
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ])
+    pending = deque()
+
+    def submit_next():
+        page_range = next(ranges, None)
+        if page_range is not None:
+            pending.append(pool.submit(_extract_pdf_range, file_path, *page_range))
+
+    for _ in range(max_workers * 2):
+        submit_next()
+
+    def ordered_pages():
+        while pending:
+            try:
+                batch = pending.popleft().result(timeout=PDF_TASK_TIMEOUT)
+            except FutureTimeout:
+                _discard_pdf_pool(pool)
+                raise TimeoutError(f"PDF extraction took longer than {PDF_TASK_TIMEOUT}s per {PDF_PAGES_PER_TASK} pages")
+            submit_next()
+            yield from batch
+
+    try:
+        yield from _within_budget(ordered_pages(), char_budget)
+    finally:
+        # Early stop (budget reached or consumer gone): drop work not started yet
+        for future in pending:
+            future.cancel()
+
+
+def extract_pages(file_path: str) -> List[str]:
+    """Extract the text of each page (or slide) of a document, uncached"""
+    ext = Path(file_path).suffix.lower()
+
+    if ext == ".pdf":
+        return list(iter_pdf_pages(file_path))
+
+    elif ext == ".docx":
+        doc = docx.Document(file_path)
+        return ["\n".join([para.text for para in doc.paragraphs])]
+
+    elif ext == ".pptx":
+        prs = Presentation(file_path)
+        slides = []
+        for slide in prs.slides:
+            slides.append("\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text")))
+        return slides
+
+    elif ext in TEXT_EXTENSIONS:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            return [f.read()]
+
+    raise UnsupportedFormatError(ext)
+
+
+def document_key(file_path: str) -> str:
+    """Content hash of a document (plus its type, which selects the extractor)"""
+    stat = os.stat(file_path)
+    path_key = (os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size)
+    key = _path_index.get(path_key)
+    if key is None:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        key = f"{digest.hexdigest()}{Path(file_path).suffix.lower()}"
+        _path_index.put(path_key, key)
+    return key
+
+
+def iter_document_pages(file_path: str, char_budget: Optional[int] = None) -> Iterator[str]:
+    """Yield per-page text of a document, served from the cache when possible.
+
+    Only complete extractions are cached; stopping early at `char_budget`
+    leaves the cache untouched.
+    """
+    ext = Path(file_path).suffix.lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise UnsupportedFormatError(ext)
+
+    key = document_key(file_path)
+    pages = _memory_cache.get(key)
+    if pages is None and _disk_store is not None:
+        pages = _disk_store.get(key)
+        if pages is not None:
+            _memory_cache.put(key, pages)
+    if pages is not None:
+        yield from _within_budget(pages, char_budget)
+        return
+
+    if ext == ".pdf":
+        source = iter_pdf_pages(file_path)
+    else:
+        source = iter(extract_pages(file_path))
+
+    pages = []
+    used = 0
+    try:
+        for page in source:
+            pages.append(page)
+            yield page
+            used += len(page)
+            if char_budget is not None and used >= char_budget:
+                return
+    finally:
+        # Stops the PDF workers if we return early or the consumer goes away
+        if hasattr(source, "close"):
+            source.close()
+
+    _memory_cache.put(key, pages)
+    if _disk_store is not None:
+        try:
+            _disk_store.put(key, pages)
+        except OSError as e:
+            logging.warning(f"Could not write document cache: {e}")
+
+
+def read_pages(file_path: str) -> List[str]:
+    """Per-page text of a whole document (cached)"""
+    return list(iter_document_pages(file_path))
+
+
+NO_TEXT_MESSAGE = "No readable text found in the file."
+
+
+def read_error_message(error: Exception) -> str:
+    """What the model is told when a report could not be read"""
+    if isinstance(error, UnsupportedFormatError):
+        return "Unsupported file format."
+    return f"Error reading file: {error}"
+
+
+def read_file_content(file_path: str, char_budget: Optional[int] = None) -> str:
+    """Extract text from PDF, DOCX, PPTX, TXT, etc."""
+    try:
+        text = "\n".join(page for page in iter_document_pages(file_path, char_budget) if page)
+    except Exception as e:
+        return read_error_message(e)
+
+    return text.strip() if text.strip() else NO_TEXT_MESSAGE
@@ -0,0 +1,80 @@
+#Opt-in cache of model answers for repeat consultations
+#(same normalized prompt + same image + same model -> same answer, no API call).
+#Enable with DOCTOR_RESPONSE_CACHE=1. Only stateless calls are cached: the vision
+#call, and DoctorChain turns that have no conversation history yet.
+import os
+import re
+import hashlib
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from caching import LRUCache
+
+RESPONSE_CACHE_ENABLED = os.environ.get("DOCTOR_RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_ENTRIES = int(os.environ.get("DOCTOR_RESPONSE_CACHE_ENTRIES", "512"))
+RESPONSE_CACHE_TTL = float(os.environ.get("DOCTOR_RESPONSE_CACHE_TTL", "3600"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case and whitespace differences should not cause a miss"""
+    return _WHITESPACE.sub(" ", prompt).strip().lower()
+
+
+class ResponseCache:
+    """TTL + LRU cache of complete model responses with hit/miss counters"""
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, max_entries: int = RESPONSE_CACHE_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.enabled = enabled
+        self.bypasses = 0
+        self._cache = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def key(self, prompt: str, model: str, image_hash: Optional[str] = None, use_cache: bool = True) -> Optional[str]:
+        """Cache key for a call, or None when this call must not be cached"""
+        if not self.enabled:
+            return None
+        if not use_cache:
+            self.bypasses += 1
+            return None
+        raw = "\x00".join([model, image_hash or "", normalize_prompt(prompt)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        return None if key is None else self._cache.get(key)
+
+    def put(self, key: Optional[str], response: str) -> None:
+        if key is not None and response:
+            self._cache.put(key, response)
+
+    def stream(self, key: Optional[str], make_stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Serve a cached answer in one piece, or stream a fresh one and remember it"""
+        cached = self.get(key)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        for token in make_stream():
+            parts.append(token)
+            yield token
+        # Only complete answers are stored
+        self.put(key, "".join(parts).strip())
+
+    async def astream(self, key: Optional[str], make_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        cached = self.get(key)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for token in make_stream():
+            parts.append(token)
+            yield token
+        self.put(key, "".join(parts).strip())
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["bypasses"] = self.bypasses
+        stats["enabled"] = self.enabled
+        return stats
+
+
+response_cache = ResponseCache()
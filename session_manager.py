@@ -0,0 +1,113 @@
+import os
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from langchain_doctor import DoctorChain
+from report_index import ReportIndex
+
+# Session limits (override with environment variables)
+MAX_SESSIONS = int(os.environ.get("DOCTOR_MAX_SESSIONS", "2000"))
+SESSION_IDLE_TTL = float(os.environ.get("DOCTOR_SESSION_TTL", "1800"))  # seconds
+SESSION_MEMORY_CHARS = int(os.environ.get("DOCTOR_SESSION_MEMORY_CHARS", "24000"))
+# Text of the session's indexed reports (the BM25 postings take about as much again)
+SESSION_REPORT_CHARS = int(os.environ.get("DOCTOR_SESSION_REPORT_CHARS", "120000"))
+
+# Turn ids are unique for the whole process: a session that is evicted and
+# recreated must not reuse the ids of bubbles still shown in the browser
+_turn_ids = itertools.count(1)
+
+
+class ConsultationSession:
+    """Everything that belongs to one patient's browser session"""
+
+    def __init__(self, session_id: str, doctor_chain: DoctorChain):
+        self.session_id = session_id
+        self.doctor_chain = doctor_chain
+        self.last_seen = time.monotonic()
+        self.turn_count = 0
+        # Uploaded reports, chunked and indexed for retrieval
+        self.report_index = ReportIndex()
+        # Set to False to always ask the model (e.g. when outside context matters)
+        self.use_response_cache = True
+        # Serializes turns of the same session (e.g. double clicks on Send)
+        self.lock = threading.Lock()
+        # Same for the asyncio pipeline; waiting on it holds no thread and is cancellable
+        self.async_lock = asyncio.Lock()
+
+
+    def next_turn_id(self) -> int:
+        self.turn_count += 1
+        return next(_turn_ids)
+
+
+class SessionManager:
+    """Bounded LRU of consultation sessions with idle-TTL eviction.
+
+    Each Gradio session gets its own DoctorChain (and therefore its own
+    memory), so patients never see each other's history and clearing one
+    chat leaves the others untouched.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        max_memory_chars: int = SESSION_MEMORY_CHARS,
+        max_report_chars: int = SESSION_REPORT_CHARS,
+        chain_factory: Callable[[], DoctorChain] = DoctorChain,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_memory_chars = max_memory_chars
+        self.max_report_chars = max_report_chars
+        self.chain_factory = chain_factory
+        self._sessions: "OrderedDict[str, ConsultationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> ConsultationSession:
+        """Return the session for `session_id`, creating it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConsultationSession(session_id, self.chain_factory())
+                self._sessions[session_id] = session
+                # Drop least recently used sessions once over capacity
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            return session
+
+    def reset(self, session_id: str) -> ConsultationSession:
+        """Start a fresh conversation for this session only"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        return self.get(session_id)
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def enforce_limits(self, session: ConsultationSession) -> None:
+        """Keep a session's memory and report index inside the per-session budget"""
+        session.doctor_chain.trim_memory(self.max_memory_chars)
+        session.report_index.trim(self.max_report_chars)
+        session.last_seen = time.monotonic()
+
+    def _evict_expired(self, now: float) -> None:
+        # Oldest sessions sit at the front, so stop at the first live one
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen < self.idle_ttl:
+                break
+            self._sessions.pop(session_id)
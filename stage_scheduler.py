@@ -0,0 +1,80 @@
+#Small dependency-aware scheduler for the independent steps of a turn
+#(e.g. transcription, report extraction and image preprocessing run side by side
+#and join before the model call, so a turn takes max(branches) instead of their sum)
+import os
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+STAGE_WORKERS = int(os.environ.get("DOCTOR_STAGE_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, deps: tuple):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+
+
+class StageScheduler:
+    """Runs each stage as soon as the stages it depends on have finished.
+
+    A stage's function receives the results of its dependencies as
+    positional arguments, in the order they were declared. Dependencies
+    must be added before the stages that use them, so cycles are impossible.
+    """
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None):
+        self.executor = executor or _executor
+        self._stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, fn: Callable, *deps: str) -> "StageScheduler":
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' already added")
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = Stage(name, fn, deps)
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        """Run all stages in the thread pool and return their results by name"""
+        pending = dict(self._stages)
+        running = {}
+        results = {}
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.deps):
+                        args = [results[dep] for dep in stage.deps]
+                        running[self.executor.submit(stage.fn, *args)] = name
+                        del pending[name]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            # A failed stage stops the turn; don't start work nobody will use
+            for future in running:
+                future.cancel()
+        return results
+
+    async def arun(self) -> Dict[str, Any]:
+        """Async `run`: coroutine stages are awaited, plain functions go to a thread"""
+        tasks = {}
+
+        async def run_stage(stage: Stage):
+            args = [await tasks[dep] for dep in stage.deps]
+            if asyncio.iscoroutinefunction(stage.fn):
+                return await stage.fn(*args)
+            return await asyncio.get_running_loop().run_in_executor(self.executor, stage.fn, *args)
+
+        for name, stage in self._stages.items():
+            tasks[name] = asyncio.ensure_future(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,216 @@
+#Per-stage latency, time-to-first-token, payload size and token metrics
+#Every stage of a turn (stt, report, image, llm, tts, render, ...) is wrapped in a
+#span; durations go into Prometheus-style histograms. Set DOCTOR_METRICS_PORT to
+#serve them at http://localhost:<port>/metrics, and DOCTOR_TELEMETRY_LOG=1 to also
+#write one JSON line per span to the "telemetry" logger.
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import AsyncIterator, Callable, Dict, Iterator, Tuple
+
+METRICS_PORT = int(os.environ.get("DOCTOR_METRICS_PORT", "0"))  # 0 = no endpoint
+TELEMETRY_LOG = os.environ.get("DOCTOR_TELEMETRY_LOG", "0") == "1"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7)
+TOKEN_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2000, 4000)
+
+logger = logging.getLogger("telemetry")
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe histograms and counters with Prometheus text output"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._gauge_sources: Dict[str, Callable[[], dict]] = {}
+
+    def observe(self, name: str, value: float, buckets: tuple = SECONDS_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_gauges(self, prefix: str, source: Callable[[], dict]) -> None:
+        """Export the numeric values of `source()` (e.g. a cache's stats) as gauges"""
+        self._gauge_sources[prefix] = source
+
+    def snapshot(self) -> dict:
+        """Plain-dict view, for benchmarks and tests"""
+        with self._lock:
+            return {
+                "histograms": {
+                    _series(name, labels): {"count": h.count, "sum": h.sum}
+                    for (name, labels), h in self._histograms.items()
+                },
+                "counters": {_series(name, labels): value for (name, labels), value in self._counters.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{_series(name + '_bucket', labels + (('le', le),))} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {histogram.sum}")
+            lines.append(f"{_series(name + '_count', labels)} {histogram.count}")
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{_series(name, labels)} {value}")
+
+        for prefix, source in list(self._gauge_sources.items()):
+            try:
+                values = source()
+            except Exception as e:
+                logger.warning(f"Metrics source {prefix} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _series(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{value}"' for key, value in labels)
+    return f"{name}{{{rendered}}}"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(stage: str, log: bool = True, **attrs):
+    """Time a stage; attributes can be added to the yielded dict while it runs"""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except GeneratorExit:
+        # A stream the consumer stopped reading early
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        metrics.inc("doctor_stage_errors_total", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("doctor_stage_duration_seconds", elapsed, stage=stage)
+        if TELEMETRY_LOG and log:
+            logger.info(json.dumps({"span": stage, "ms": round(elapsed * 1000, 2), "status": status, **attrs}, default=str))
+
+
+def record_bytes(kind: str, size: int) -> None:
+    """Size of something sent or received (upload, image, audio, report)"""
+    metrics.observe("doctor_payload_bytes", size, buckets=BYTES_BUCKETS, kind=kind)
+
+
+def record_tokens(stage: str, tokens: int) -> None:
+    metrics.observe("doctor_tokens", tokens, buckets=TOKEN_BUCKETS, stage=stage)
+    metrics.inc("doctor_tokens_total", tokens, stage=stage)
+
+
+def timed_stream(stage: str, tokens: Iterator[str]) -> Iterator[str]:
+    """Pass a token stream through, recording time-to-first-token, duration and token count.
+
+    Each streamed chunk counts as one token, which is what Groq sends.
+    """
+    start = time.perf_counter()
+    count = 0
+    with span(stage) as attrs:
+        for token in tokens:
+            if count == 0:
+                attrs["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                metrics.observe("doctor_ttft_seconds", time.perf_counter() - start, stage=stage)
+            count += 1
+            yield token
+        attrs["tokens"] = count
+        record_tokens(stage, count)
+
+
+async def atimed_stream(stage: str, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    start = time.perf_counter()
+    count = 0
+    with span(stage) as attrs:
+        async for token in tokens:
+            if count == 0:
+                attrs["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                metrics.observe("doctor_ttft_seconds", time.perf_counter() - start, stage=stage)
+            count += 1
+            yield token
+        attrs["tokens"] = count
+        record_tokens(stage, count)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics in a daemon thread (no-op when port is 0)"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics at http://localhost:{port}/metrics")
+    return server
@@ -0,0 +1,52 @@
+from report_index import ReportIndex
+
+LAB_REPORT = (
+    "Complete blood count. Haemoglobin 11.2 g/dL (reference 13.0 to 17.0), low. "
+    "White cell count 7.2 x10^9/L, normal. Platelets 250 x10^9/L, normal. "
+    "Ferritin 12 ng/mL (reference 30 to 400), low. Vitamin B12 410 pg/mL, normal."
+)
+
+LIPID_PAGES = [
+    "Lipid panel, visit %d. Total cholesterol %d mg/dL. LDL cholesterol borderline." % (n, 200 + n)
+    for n in range(5)
+] + ["Thyroid panel. TSH 2.1 mIU/L, within the reference range."]
+
+
+def test_follow_up_question_on_one_page_report():
+    index = ReportIndex()
+    assert index.add_document("cbc.pdf", [LAB_REPORT]) == 1
+
+    assert index.search("what is my haemoglobin?") == [("cbc.pdf", LAB_REPORT)]
+    assert index.search("is my ferritin low") == [("cbc.pdf", LAB_REPORT)]
+    assert "Ferritin 12 ng/mL" in index.context_for("is my ferritin low")
+
+
+def test_common_term_still_matches():
+    index = ReportIndex()
+    index.add_document("labs.pdf", LIPID_PAGES)
+
+    sources = [source for source, _ in index.search("is my cholesterol high?")]
+    assert sources and "labs.pdf, page 6" not in sources
+    assert [source for source, _ in index.search("what about my tsh")] == ["labs.pdf, page 6"]
+
+
+def test_unrelated_question_gets_no_excerpts():
+    index = ReportIndex()
+    index.add_document("cbc.pdf", [LAB_REPORT])
+
+    assert index.search("what should I do about my headache?") == []
+    assert index.search("what does it say?", fallback=True) == [("cbc.pdf", LAB_REPORT)]
+
+
+def test_trim_drops_oldest_reports_first():
+    index = ReportIndex()
+    index.add_document("old.pdf", [LAB_REPORT])
+    index.add_document("labs.pdf", LIPID_PAGES)
+    newest_chars = index.text_chars() - len(LAB_REPORT)
+
+    index.trim(newest_chars)
+    assert index.text_chars() == newest_chars
+    assert index.search("is my ferritin low") == []
+
+    index.trim(newest_chars // 2)
+    assert 0 < index.text_chars() <= newest_chars // 2
@@ -0,0 +1,120 @@
+#Content-addressed cache of synthesized speech
+#Key = text + voice + engine + format, files live on disk under a size cap and
+#the least recently used ones are evicted first. Responses are synthesized per
+#sentence, so stock sentences ("Please consult a doctor in person.") are reused
+#across different answers.
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from caching import evict_files
+
+TTS_CACHE_DIR = os.environ.get("DOCTOR_TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ai_doctor_tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.environ.get("DOCTOR_TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class TTSCache:
+    """Disk cache of audio clips with size-capped LRU eviction"""
+
+    def __init__(self, root: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Running total so eviction doesn't have to scan the directory on every write
+        self._total_bytes = sum(p.stat().st_size for p in self.root.glob("*.*") if p.is_file())
+
+    def key(self, text: str, voice: str, engine: str, fmt: str) -> str:
+        normalized = _WHITESPACE.sub(" ", text).strip()
+        return hashlib.sha256("\x00".join([engine, voice, fmt, normalized]).encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str, fmt: str) -> Path:
+        return self.root / f"{key}.{fmt}"
+
+    def get(self, text: str, voice: str, engine: str, fmt: str) -> Optional[str]:
+        path = self.path_for(self.key(text, voice, engine, fmt), fmt)
+        try:
+            # Touch so LRU eviction keeps clips that are still being reused
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return str(path)
+
+    def get_bytes(self, text: str, voice: str, engine: str, fmt: str) -> Optional[bytes]:
+        path = self.get(text, voice, engine, fmt)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            # Evicted between the lookup and the read
+            return None
+
+    def get_or_create_bytes(self, text: str, voice: str, engine: str, fmt: str, synthesize: Callable[[str], bytes]) -> bytes:
+        """Return a cached clip, calling `synthesize(text)` for the audio bytes if needed.
+
+        Fresh audio is handed back directly; the cache copy is written (to a
+        temp name, then renamed, so readers never see half a file) but never
+        read back on this call.
+        """
+        cached = self.get_bytes(text, voice, engine, fmt)
+        if cached is not None:
+            return cached
+
+        data = synthesize(text)
+        path = self.path_for(self.key(text, voice, engine, fmt), fmt)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # The audio is already in memory, a failed cache write shouldn't fail the turn
+            logging.warning(f"Could not cache TTS clip {path}: {e}")
+        else:
+            self._added(len(data))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return data
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            self._total_bytes += size
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            clips = (path for path in self.root.iterdir() if path.suffix != ".part")
+            # Leave some headroom so we don't evict again on the next write
+            _, self._total_bytes = evict_files(clips, self.max_bytes * 0.9)
+
+    def stats(self) -> dict:
+        return {"bytes": self._total_bytes, "hits": self.hits, "misses": self.misses}
+
+
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Process-wide TTS cache (created on first use)"""
+    global _tts_cache
+    with _tts_cache_lock:
+        if _tts_cache is None:
+            _tts_cache = TTSCache()
+        return _tts_cache
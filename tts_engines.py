@@ -0,0 +1,245 @@
+#Pluggable text-to-speech engines with fallback
+#DOCTOR_TTS_ENGINES lists the engines in order of preference, e.g. "gtts,espeak".
+#An engine that errors, or takes longer than DOCTOR_TTS_LATENCY_BUDGET seconds,
+#is skipped for DOCTOR_TTS_COOLDOWN seconds and the next one in the list is used.
+#Each engine has its own worker threads, so calls stuck in one engine can't starve the others.
+#espeak/piper run locally, so speech keeps working (with predictable latency)
+#when the network engines are slow, rate-limited or not configured.
+import io
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+
+from tts_cache import get_tts_cache
+from tts_pipeline import TTS_WORKERS
+from telemetry import metrics, span
+
+try:
+    # Piper is optional (pip install piper-tts, plus a voice model)
+    from piper.voice import PiperVoice
+except ImportError:
+    PiperVoice = None
+
+TTS_ENGINES = [name.strip() for name in os.environ.get("DOCTOR_TTS_ENGINES", "gtts,espeak").split(",") if name.strip()]
+TTS_LATENCY_BUDGET = float(os.environ.get("DOCTOR_TTS_LATENCY_BUDGET", "3.0"))  # seconds per sentence
+TTS_COOLDOWN = float(os.environ.get("DOCTOR_TTS_COOLDOWN", "60"))
+# How long the last engine in the list may take before the sentence is skipped
+TTS_FINAL_TIMEOUT = float(os.environ.get("DOCTOR_TTS_FINAL_TIMEOUT", "30"))
+ESPEAK_VOICE = os.environ.get("DOCTOR_ESPEAK_VOICE", "en-us")
+ESPEAK_RATE = os.environ.get("DOCTOR_ESPEAK_RATE", "165")
+PIPER_MODEL = os.environ.get("DOCTOR_PIPER_MODEL")
+
+
+def wav_to_mp3(wav_bytes: bytes) -> bytes:
+    """Local engines produce WAV; the audio stream to the browser is MP3"""
+    from pydub import AudioSegment
+
+    buffer = io.BytesIO()
+    AudioSegment.from_file(io.BytesIO(wav_bytes), format="wav").export(buffer, format="mp3", bitrate="64k")
+    return buffer.getvalue()
+
+
+class TTSEngine:
+    """One speech synthesizer; `synthesize` returns MP3 bytes"""
+
+    name = "base"
+
+    @property
+    def voice(self) -> str:
+        """Part of the TTS cache key, so clips from different voices never mix"""
+        return ""
+
+    def available(self) -> bool:
+        return True
+
+    def synthesize(self, text: str) -> bytes:
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    name = "gtts"
+
+    @property
+    def voice(self) -> str:
+        return "en"
+
+    def synthesize(self, text: str) -> bytes:
+        from voice_of_the_doctor import _gtts_to_bytes
+        return _gtts_to_bytes(text)
+
+
+class ElevenLabsEngine(TTSEngine):
+    name = "elevenlabs"
+
+    @property
+    def voice(self) -> str:
+        from voice_of_the_doctor import ELEVENLABS_MODEL_ID, ELEVENLABS_OUTPUT_FORMAT, ELEVENLABS_VOICE_ID
+        return f"{ELEVENLABS_VOICE_ID}/{ELEVENLABS_MODEL_ID}/{ELEVENLABS_OUTPUT_FORMAT}"
+
+    def available(self) -> bool:
+        return bool(os.environ.get("ELEVENLABS_API_KEY"))
+
+    def synthesize(self, text: str) -> bytes:
+        from voice_of_the_doctor import _elevenlabs_to_bytes
+        return _elevenlabs_to_bytes(text)
+
+
+class EspeakEngine(TTSEngine):
+    """espeak-ng (or espeak) subprocess, no network"""
+
+    name = "espeak"
+
+    def __init__(self, voice: str = ESPEAK_VOICE, rate: str = ESPEAK_RATE):
+        self._voice = voice
+        self.rate = rate
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    @property
+    def voice(self) -> str:
+        return f"{self._voice}/{self.rate}"
+
+    def available(self) -> bool:
+        return self.binary is not None
+
+    def synthesize(self, text: str) -> bytes:
+        # Text goes in on stdin: as an argument, "- take two tablets" would be read as an option
+        result = subprocess.run(
+            [self.binary, "-v", self._voice, "-s", str(self.rate), "--stdout", "--stdin"],
+            input=text.encode("utf-8"),
+            capture_output=True,
+            check=True,
+            timeout=30,
+        )
+        return wav_to_mp3(result.stdout)
+
+
+class PiperEngine(TTSEngine):
+    """Piper neural TTS run in-process (model loaded once, shared by the workers)"""
+
+    name = "piper"
+
+    def __init__(self, model_path: Optional[str] = PIPER_MODEL):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def voice(self) -> str:
+        return os.path.basename(self.model_path or "")
+
+    def available(self) -> bool:
+        return PiperVoice is not None and bool(self.model_path) and os.path.exists(self.model_path)
+
+    def synthesize(self, text: str) -> bytes:
+        import wave
+
+        with self._lock:
+            if self._model is None:
+                self._model = PiperVoice.load(self.model_path)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            self._model.synthesize(text, wav_file)
+        return wav_to_mp3(buffer.getvalue())
+
+
+ENGINE_CLASSES = {
+    "gtts": GTTSEngine,
+    "elevenlabs": ElevenLabsEngine,
+    "espeak": EspeakEngine,
+    "piper": PiperEngine,
+}
+
+
+class TTSRouter:
+    """Tries engines in order of preference, with a latency budget and cooldown"""
+
+    def __init__(
+        self,
+        engines: List[TTSEngine],
+        latency_budget: float = TTS_LATENCY_BUDGET,
+        cooldown: float = TTS_COOLDOWN,
+        final_timeout: float = TTS_FINAL_TIMEOUT,
+    ):
+        if not engines:
+            raise ValueError("No TTS engine available")
+        self.engines = engines
+        self.latency_budget = latency_budget
+        self.cooldown = cooldown
+        self.final_timeout = final_timeout
+        # Engine calls run here so a slow one can be abandoned after the latency
+        # budget; one pool per engine, so abandoned calls only tie up their own engine
+        self._executors = {
+            e.name: ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix=f"tts-{e.name}")
+            for e in engines
+        }
+        self._skip_until: Dict[str, float] = {}
+        self.fallbacks = 0
+
+    def speak(self, sentence: str) -> bytes:
+        """MP3 bytes for one sentence from the first engine that answers in time"""
+        now = time.monotonic()
+        healthy = [e for e in self.engines if self._skip_until.get(e.name, 0) <= now]
+        # If every engine is cooling down, try them all anyway rather than go silent
+        candidates = healthy or self.engines
+        last_error = None
+
+        for i, engine in enumerate(candidates):
+            is_last = i == len(candidates) - 1
+            future = self._executors[engine.name].submit(
+                get_tts_cache().get_or_create_bytes, sentence, engine.voice, engine.name, "mp3", engine.synthesize
+            )
+            try:
+                # The last engine gets longer, there's nothing to fall back to
+                timeout = self.final_timeout if is_last else self.latency_budget
+                with span(f"tts_{engine.name}", log=False):
+                    return future.result(timeout=timeout)
+            except FutureTimeout:
+                # Left running: when it finishes, the clip still lands in the TTS cache
+                last_error = TimeoutError(f"{engine.name} took longer than {timeout}s")
+            except Exception as e:
+                last_error = e
+            logging.warning(f"TTS engine {engine.name} failed, falling back: {last_error}")
+            self._skip_until[engine.name] = time.monotonic() + self.cooldown
+            self.fallbacks += 1
+            metrics.inc("doctor_tts_fallbacks_total", engine=engine.name)
+        raise last_error
+
+    def stats(self) -> dict:
+        return {
+            "engines": [e.name for e in self.engines],
+            "cooling_down": [name for name, until in self._skip_until.items() if until > time.monotonic()],
+            "fallbacks": self.fallbacks,
+        }
+
+
+def build_engines(names: List[str] = TTS_ENGINES) -> List[TTSEngine]:
+    engines = []
+    for name in names:
+        engine_class = ENGINE_CLASSES.get(name)
+        if engine_class is None:
+            logging.warning(f"Unknown TTS engine '{name}', skipped")
+            continue
+        engine = engine_class()
+        if engine.available():
+            engines.append(engine)
+        else:
+            logging.warning(f"TTS engine '{name}' is not available here, skipped")
+    return engines
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_tts_router() -> TTSRouter:
+    """Process-wide router over the engines in DOCTOR_TTS_ENGINES"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = TTSRouter(build_engines())
+        return _router
@@ -0,0 +1,114 @@
+import os
+import re
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+# Sentences are synthesized concurrently by this many workers (shared by all sessions)
+TTS_WORKERS = int(os.environ.get("DOCTOR_TTS_WORKERS", "4"))
+# Sentences shorter than this are merged with the next one to avoid choppy audio
+MIN_SENTENCE_CHARS = int(os.environ.get("DOCTOR_TTS_MIN_SENTENCE_CHARS", "40"))
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+
+class SentenceSplitter:
+    """Turns a stream of LLM tokens into complete sentences"""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._pending = ""
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token and return the sentences it completed"""
+        self._buffer += token
+        parts = _SENTENCE_BOUNDARY.split(self._buffer)
+        # The last part has no boundary after it yet
+        self._buffer = parts.pop()
+        sentences = []
+        for part in parts:
+            self._pending = f"{self._pending} {part}".strip()
+            if len(self._pending) >= self.min_chars:
+                sentences.append(self._pending)
+                self._pending = ""
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever text is left once the stream has ended"""
+        rest = f"{self._pending} {self._buffer}".strip()
+        self._pending = self._buffer = ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str, min_chars: int = MIN_SENTENCE_CHARS) -> List[str]:
+    """Split a complete text the same way a streamed one would be"""
+    splitter = SentenceSplitter(min_chars)
+    return splitter.feed(text) + splitter.flush()
+
+
+class SentenceTTSPipeline:
+    """Synthesizes a response sentence by sentence while it is still streaming.
+
+    Sentences go to a shared worker pool as soon as they are complete, and
+    audio chunks come back in sentence order, so playback can start after
+    the first sentence instead of after the whole answer.
+    """
+
+    def __init__(self, synthesize: Callable[[str], bytes], splitter: Optional[SentenceSplitter] = None):
+        self.synthesize = synthesize
+        self.splitter = splitter or SentenceSplitter()
+        self._futures = deque()
+        self.submitted = 0
+
+    def feed(self, token: str) -> None:
+        for sentence in self.splitter.feed(token):
+            self._submit(sentence)
+
+    def close(self) -> None:
+        """Submit the trailing partial sentence"""
+        for sentence in self.splitter.flush():
+            self._submit(sentence)
+
+    def ready(self) -> Iterator[bytes]:
+        """Yield finished chunks in order without blocking"""
+        while self._futures and self._futures[0].done():
+            chunk = self._result(self._futures.popleft())
+            if chunk:
+                yield chunk
+
+    def drain(self) -> Iterator[bytes]:
+        """Yield all remaining chunks in order, waiting for each"""
+        while self._futures:
+            chunk = self._result(self._futures.popleft())
+            if chunk:
+                yield chunk
+
+    async def adrain(self) -> AsyncIterator[bytes]:
+        """`drain` for the asyncio pipeline: awaits chunks without blocking the loop"""
+        while self._futures:
+            future = self._futures.popleft()
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                pass  # logged by _result
+            chunk = self._result(future)
+            if chunk:
+                yield chunk
+
+    def _submit(self, sentence: str) -> None:
+        self._futures.append(_executor.submit(self.synthesize, sentence))
+        self.submitted += 1
+
+    @staticmethod
+    def _result(future):
+        try:
+            return future.result()
+        except Exception as e:
+            # A failed sentence is skipped, the rest of the answer still plays
+            logging.error(f"Sentence synthesis failed: {e}")
+            return None
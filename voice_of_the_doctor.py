@@ -40,9 +40,6 @@ def text_to_speech_with_elevenlabs_old(input_text, output_filepath):
 # so we will add code to play the audio file automatically after creation
 #Step2: Use Model for Text output to Voice
 
-import subprocess
-import platform
-
 # def text_to_speech_with_gtts(input_text, output_filepath):
 #     language="en"
 
@@ -68,16 +65,56 @@ import platform
 #         return output_filepath
 
 from gtts import gTTS
-
-def text_to_speech_with_gtts(input_text, output_filepath="final.mp3") -> str:
-    language = "en"
-
+import io
+from typing import Iterator
+from tts_cache import get_tts_cache
+from audio_store import get_audio_store
+from audio_player import get_audio_player
+from telemetry import record_bytes, span
+from tts_pipeline import split_sentences
+
+# Network TTS calls give up after this many seconds instead of hanging a worker thread
+TTS_REQUEST_TIMEOUT=float(os.environ.get("DOCTOR_TTS_REQUEST_TIMEOUT", "10"))
+
+# ✅ Speech is synthesized (and cached) one sentence at a time, so sentences that
+# show up in many answers are only ever synthesized once
+# ✅ Audio stays in memory: gTTS writes into a buffer and the bytes go straight to
+# Gradio, no temp file written and read back on every turn
+def _gtts_to_bytes(input_text) -> bytes:
     audioobj = gTTS(
         text=input_text,
-        lang=language,
-        slow=False
+        lang="en",
+        slow=False,
+        timeout=TTS_REQUEST_TIMEOUT
     )
-    audioobj.save(output_filepath)
+    buffer = io.BytesIO()
+    with span("tts_synthesize", engine="gtts", chars=len(input_text)):
+        audioobj.write_to_fp(buffer)
+    record_bytes("tts_audio", buffer.tell())
+    return buffer.getvalue()
+
+def gtts_sentence_audio(sentence) -> bytes:
+    """MP3 bytes of the (cached) gTTS clip for one sentence"""
+    return get_tts_cache().get_or_create_bytes(
+        sentence, voice="en", engine="gtts", fmt="mp3", synthesize=_gtts_to_bytes
+    )
+
+def speech_with_gtts(input_text) -> bytes:
+    """Whole response as MP3 bytes (MP3 is frame based, so clips can simply be concatenated)"""
+    sentences = split_sentences(input_text)
+    if not sentences:
+        raise ValueError("No text to speak")
+    return b"".join(gtts_sentence_audio(sentence) for sentence in sentences)
+
+def _write_audio(data, output_filepath):
+    with open(output_filepath, "wb") as output_file:
+        output_file.write(data)
+
+def text_to_speech_with_gtts(input_text, output_filepath=None) -> str:
+    data = speech_with_gtts(input_text)
+    # ✅ Unique file in the managed audio directory (cleaned up in the background)
+    output_filepath = output_filepath or get_audio_store().new_path(".mp3")
+    _write_audio(data, output_filepath)
 
     # ✅ Don't try to play locally, just return path for Gradio
     return output_filepath
@@ -88,26 +125,49 @@ input_text="Hi this is Rafay, autoplay testing!"
 #text_to_speech_with_gtts(input_text=input_text, output_filepath="gtts_testing_autoplay.mp3")
 
 
-def text_to_speech_with_elevenlabs(input_text, output_filepath):
-    client=ElevenLabs(api_key=ELEVENLABS_API_KEY)
+ELEVENLABS_VOICE_ID="repzAAjoKlgcT2oOAIWt"
+ELEVENLABS_MODEL_ID="eleven_turbo_v2"
+ELEVENLABS_OUTPUT_FORMAT="mp3_22050_32"
+
+def stream_elevenlabs(input_text) -> Iterator[bytes]:
+    """Audio chunks as ElevenLabs sends them (convert returns a byte iterator)"""
+    client=ElevenLabs(api_key=ELEVENLABS_API_KEY, timeout=TTS_REQUEST_TIMEOUT)
     audio=client.text_to_speech.convert(
         text= input_text,
-        voice_id= "repzAAjoKlgcT2oOAIWt",
-        output_format= "mp3_22050_32",
-        model_id= "eleven_turbo_v2"
+        voice_id= ELEVENLABS_VOICE_ID,
+        output_format= ELEVENLABS_OUTPUT_FORMAT,
+        model_id= ELEVENLABS_MODEL_ID
     )
-    elevenlabs.save(audio, output_filepath)
-    os_name = platform.system()
-    try:
-        if os_name == "Darwin":  # macOS
-            subprocess.run(['afplay', output_filepath])
-        elif os_name == "Windows":  # Windows
-            subprocess.run(['powershell', '-c', f'(New-Object Media.SoundPlayer "{output_filepath}").PlaySync();'])
-        elif os_name == "Linux":  # Linux
-            subprocess.run(['aplay', output_filepath])  # Alternative: use 'mpg123' or 'ffplay'
-        else:
-            raise OSError("Unsupported operating system")
-    except Exception as e:
-        print(f"An error occurred while trying to play the audio: {e}")
+    for chunk in audio:
+        if chunk:
+            yield chunk
+
+def _elevenlabs_to_bytes(input_text) -> bytes:
+    with span("tts_synthesize", engine="elevenlabs", chars=len(input_text)):
+        data = b"".join(stream_elevenlabs(input_text))
+    record_bytes("tts_audio", len(data))
+    return data
+
+def elevenlabs_sentence_audio(sentence) -> bytes:
+    """MP3 bytes of the (cached) ElevenLabs clip for one sentence"""
+    return get_tts_cache().get_or_create_bytes(
+        sentence,
+        voice=f"{ELEVENLABS_VOICE_ID}/{ELEVENLABS_MODEL_ID}/{ELEVENLABS_OUTPUT_FORMAT}",
+        engine="elevenlabs",
+        fmt="mp3",
+        synthesize=_elevenlabs_to_bytes
+    )
+
+def speech_with_elevenlabs(input_text) -> bytes:
+    return b"".join(elevenlabs_sentence_audio(sentence) for sentence in split_sentences(input_text))
+
+def text_to_speech_with_elevenlabs(input_text, output_filepath=None):
+    output_filepath = output_filepath or get_audio_store().new_path(".mp3")
+    # Local playback below needs a file; the Gradio path uses the bytes directly
+    _write_audio(speech_with_elevenlabs(input_text), output_filepath)
+    # ✅ Queued on the background player, so the caller can synthesize the next
+    # response while this one plays (get_audio_player().stop() cancels it)
+    get_audio_player().play(output_filepath)
+    return output_filepath
 
 # text_to_speech_with_elevenlabs(input_text, output_filepath="elevenlabs_testing_autoplay.mp3")
@@ -9,20 +9,66 @@ from io import BytesIO
 from pydub.utils import which
 import os
 
-AudioSegment.converter = which("C:\\ffmpeg\\bin\\ffmpeg.exe")
-AudioSegment.ffmpeg = AudioSegment.converter
-AudioSegment.ffprobe = which("C:\\ffmpeg\\bin\\ffprobe.exe")
+def _find_tool(name):
+    """The C:\\ffmpeg build on Windows, otherwise whatever is on the PATH"""
+    windows_path = f"C:\\ffmpeg\\bin\\{name}.exe"
+    if os.path.exists(windows_path):
+        return windows_path
+    return which(name)
+
+# Only override pydub's own lookup when something was found, so encoding
+# (MP3, Opus, the local TTS engines) keeps working on Linux and macOS
+FFMPEG = _find_tool("ffmpeg")
+FFPROBE = _find_tool("ffprobe")
+if FFMPEG:
+    AudioSegment.converter = FFMPEG
+    AudioSegment.ffmpeg = FFMPEG
+if FFPROBE:
+    AudioSegment.ffprobe = FFPROBE
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def record_audio(file_path, timeout=20, phrase_time_limit=None):
+# ✅ The recording stays in memory and goes to transcribe_with_groq as bytes:
+# WAV for short utterances (no encoding at all), FLAC or Opus once the upload gets big.
+# The ffmpeg MP3 encode only runs when an archive copy is asked for.
+STT_CODEC=os.environ.get("DOCTOR_STT_CODEC", "auto")  # auto, wav, flac or opus
+STT_WAV_MAX_BYTES=int(os.environ.get("DOCTOR_STT_WAV_MAX_BYTES", str(1024 * 1024)))
+STT_OPUS_MIN_BYTES=int(os.environ.get("DOCTOR_STT_OPUS_MIN_BYTES", str(8 * 1024 * 1024)))
+
+def encode_for_stt(audio_data, codec=STT_CODEC):
+    """(filename, bytes) for a recording; with codec="auto" the codec is picked by size"""
+    wav_bytes=audio_data.get_wav_data(convert_rate=16000, convert_width=2)
+    if codec == "auto":
+        if len(wav_bytes) <= STT_WAV_MAX_BYTES:
+            codec="wav"
+        elif len(wav_bytes) < STT_OPUS_MIN_BYTES:
+            codec="flac"
+        else:
+            codec="opus"
+
+    if codec == "flac":
+        # lossless, about half the size of WAV (speech_recognition ships the flac encoder)
+        return "audio.flac", audio_data.get_flac_data(convert_rate=16000, convert_width=2)
+    if codec == "opus":
+        buffer=BytesIO()
+        AudioSegment.from_wav(BytesIO(wav_bytes)).set_channels(1).export(
+            buffer, format="ogg", codec="libopus", bitrate="24k"
+        )
+        return "audio.ogg", buffer.getvalue()
+    return "audio.wav", wav_bytes
+
+def record_audio(file_path=None, timeout=20, phrase_time_limit=None, codec=STT_CODEC):
     """
-    Simplified function to record audio from the microphone and save it as an MP3 file.
+    Simplified function to record audio from the microphone.
 
     Args:
-    file_path (str): Path to save the recorded audio file.
+    file_path (str): Optional path to also save the recording as an MP3 archive copy.
     timeout (int): Maximum time to wait for a phrase to start (in seconds).
     phrase_time_lfimit (int): Maximum time for the phrase to be recorded (in seconds).
+    codec (str): Upload codec, "auto", "wav", "flac" or "opus".
+
+    Returns:
+    (filename, bytes) that can be passed straight to transcribe_with_groq, or None on error.
     """
     recognizer = sr.Recognizer()
     
@@ -36,12 +82,15 @@ def record_audio(file_path, timeout=20, phrase_time_limit=None):
             audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
             logging.info("Recording complete.")
             
-            # Convert the recorded audio to an MP3 file
-            wav_data = audio_data.get_wav_data()
-            audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
-            audio_segment.export(file_path, format="mp3", bitrate="128k")
-            
-            logging.info(f"Audio saved to {file_path}")
+            if file_path:
+                # Convert the recorded audio to an MP3 file
+                wav_data = audio_data.get_wav_data()
+                audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
+                audio_segment.export(file_path, format="mp3", bitrate="128k")
+                
+                logging.info(f"Audio saved to {file_path}")
+
+            return encode_for_stt(audio_data, codec)
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
@@ -51,19 +100,229 @@ audio_filepath="patient_voice_test_for_patient.mp3"
 # record_audio(file_path=audio_filepath)
 
 # Step2: Setup Speech to text for transcription
-from groq import Groq
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pydub.silence import split_on_silence
+from groq_clients import get_groq_client, get_async_groq_client
+from telemetry import record_bytes, span
 
 GROQ_API_KEY=os.environ.get("GROQ_API_KEY")
 stt_model="whisper-large-v3"
 
-def transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY):
-    client=Groq(api_key=GROQ_API_KEY)
-    
-    audio_file=open(audio_filepath, "rb")
+# "auto" lets Whisper detect the language (per chunk for long recordings)
+STT_LANGUAGE=os.environ.get("DOCTOR_STT_LANGUAGE", "en")
+# Recordings bigger than this are split on silence and the chunks transcribed in parallel
+STT_CHUNK_THRESHOLD_BYTES=int(os.environ.get("DOCTOR_STT_CHUNK_THRESHOLD_BYTES", str(4 * 1024 * 1024)))
+STT_CHUNK_SECONDS=float(os.environ.get("DOCTOR_STT_CHUNK_SECONDS", "60"))
+STT_WORKERS=int(os.environ.get("DOCTOR_STT_WORKERS", "4"))
+
+_stt_executor=ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt")
+
+def _language_kwargs(language):
+    return {} if not language or language == "auto" else {"language": language}
+
+def split_audio_on_silence(audio_filepath, chunk_seconds=STT_CHUNK_SECONDS):
+    """Split a recording (path or file-like) at pauses into MP3 chunks of at most ~chunk_seconds, in order"""
+    audio=AudioSegment.from_file(audio_filepath)
+    max_ms=int(chunk_seconds * 1000)
+    pieces=split_on_silence(
+        audio,
+        min_silence_len=700,
+        silence_thresh=audio.dBFS - 16,
+        keep_silence=250
+    ) or [audio]
+
+    # merge the pieces back up to the chunk length, so a chunk is never cut mid-word;
+    # a single piece longer than that (no pauses at all) is cut hard
+    chunks=[]
+    current=None
+    for piece in pieces:
+        for start in range(0, len(piece), max_ms):
+            part=piece[start:start + max_ms]
+            if current is not None and len(current) + len(part) <= max_ms:
+                current+=part
+            else:
+                if current is not None:
+                    chunks.append(current)
+                current=part
+    if current is not None:
+        chunks.append(current)
+
+    encoded=[]
+    for chunk in chunks:
+        buffer=BytesIO()
+        chunk.set_channels(1).export(buffer, format="mp3", bitrate="64k")
+        encoded.append(buffer.getvalue())
+    return encoded
+
+def _transcribe_bytes(client, stt_model, filename, audio_bytes, language):
     transcription=client.audio.transcriptions.create(
         model=stt_model,
-        file=audio_file,
-        language="en"
+        file=(filename, audio_bytes),
+        **_language_kwargs(language)
+    )
+    return transcription.text.strip()
+
+def _audio_size(audio):
+    if isinstance(audio, str):
+        return os.path.getsize(audio)
+    return len(_audio_payload(audio)[1])
+
+def _audio_payload(audio):
+    """(filename, bytes) from raw bytes or a (filename, bytes) tuple as returned by record_audio"""
+    if isinstance(audio, tuple):
+        return audio
+    return "audio.wav", audio
+
+def _audio_source(audio):
+    """Something AudioSegment.from_file can read: the path, or the bytes in a buffer"""
+    return audio if isinstance(audio, str) else BytesIO(_audio_payload(audio)[1])
+
+# audio_filepath can be a path, raw audio bytes, or a (filename, bytes) tuple
+def transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language=STT_LANGUAGE):
+    size=_audio_size(audio_filepath)
+    record_bytes("stt_upload", size)
+    with span("stt", model=stt_model, bytes=size):
+        return _transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language, size)
+
+def _transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language, size):
+    client=get_groq_client(GROQ_API_KEY)
+
+    if size <= STT_CHUNK_THRESHOLD_BYTES:
+        if not isinstance(audio_filepath, str):
+            filename, audio_bytes=_audio_payload(audio_filepath)
+            return _transcribe_bytes(client, stt_model, filename, audio_bytes, language)
+        with open(audio_filepath, "rb") as audio_file:
+            transcription=client.audio.transcriptions.create(
+                model=stt_model,
+                file=audio_file,
+                **_language_kwargs(language)
+            )
+        return transcription.text
+
+    # long voice memo: chunks are uploaded concurrently, map() keeps them in order
+    chunks=split_audio_on_silence(_audio_source(audio_filepath))
+    logging.info(f"Transcribing {len(chunks)} chunks")
+    texts=_stt_executor.map(
+        lambda item: _transcribe_bytes(client, stt_model, f"chunk_{item[0]}.mp3", item[1], language),
+        enumerate(chunks)
     )
+    return " ".join(text for text in texts if text)
+
+async def atranscribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language=STT_LANGUAGE):
+    size=_audio_size(audio_filepath)
+    record_bytes("stt_upload", size)
+    with span("stt", model=stt_model, bytes=size):
+        return await _atranscribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language, size)
+
+async def _atranscribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language, size):
+    client=get_async_groq_client(GROQ_API_KEY)
+
+    if size <= STT_CHUNK_THRESHOLD_BYTES:
+        if isinstance(audio_filepath, str):
+            # reading the file is blocking, do it in a worker thread
+            audio_bytes=await asyncio.to_thread(_read_bytes, audio_filepath)
+            filename=os.path.basename(audio_filepath)
+        else:
+            filename, audio_bytes=_audio_payload(audio_filepath)
+        transcription=await client.audio.transcriptions.create(
+            model=stt_model,
+            file=(filename, audio_bytes),
+            **_language_kwargs(language)
+        )
+        return transcription.text
+
+    chunks=await asyncio.to_thread(split_audio_on_silence, _audio_source(audio_filepath))
+    # same concurrency cap as the thread pool in the sync version
+    semaphore=asyncio.Semaphore(STT_WORKERS)
+
+    async def transcribe_chunk(i, chunk):
+        async with semaphore:
+            transcription=await client.audio.transcriptions.create(
+                model=stt_model,
+                file=(f"chunk_{i}.mp3", chunk),
+                **_language_kwargs(language)
+            )
+        return transcription.text.strip()
+
+    texts=await asyncio.gather(*[transcribe_chunk(i, chunk) for i, chunk in enumerate(chunks)])
+    return " ".join(text for text in texts if text)
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+# Step3: Streaming capture -- each phrase is sent for transcription as soon as the
+# recognizer's voice activity detection sees the pause after it, while the patient
+# keeps talking. Any speech_recognition AudioSource works, e.g. sr.AudioFile("memo.wav")
+# instead of the microphone for tests.
+STREAM_SEGMENT_SECONDS=float(os.environ.get("DOCTOR_STREAM_SEGMENT_SECONDS", "15"))
+STREAM_END_SILENCE=float(os.environ.get("DOCTOR_STREAM_END_SILENCE", "2.0"))
+MIN_SEGMENT_SECONDS=0.3
+
+def stream_transcription(source=None, stt_model=stt_model, GROQ_API_KEY=GROQ_API_KEY, language=STT_LANGUAGE,
+                         timeout=20, segment_seconds=STREAM_SEGMENT_SECONDS, end_silence=STREAM_END_SILENCE):
+    """
+    Listen and yield the transcript phrase by phrase, in order.
+
+    Args:
+    source: speech_recognition AudioSource, defaults to the microphone.
+    timeout (int): Maximum time to wait for the patient to start speaking (in seconds).
+    segment_seconds (float): Longest segment sent in one request (in seconds).
+    end_silence (float): Silence after a phrase that ends the recording (in seconds).
+    """
+    client=get_groq_client(GROQ_API_KEY)
+    recognizer=sr.Recognizer()
+    source=source if source is not None else sr.Microphone()
+    pending=[]
+    segments=0
+
+    def finished():
+        # transcripts whose earlier segments are all done too
+        while pending and pending[0].done():
+            text=pending.pop(0).result()
+            if text:
+                yield text
+
+    with source:
+        if isinstance(source, sr.Microphone):
+            logging.info("Adjusting for ambient noise...")
+            recognizer.adjust_for_ambient_noise(source, duration=1)
+            logging.info("Start speaking now...")
+
+        while True:
+            try:
+                audio_data=recognizer.listen(
+                    source,
+                    timeout=end_silence if pending else timeout,
+                    phrase_time_limit=segment_seconds
+                )
+            except sr.WaitTimeoutError:
+                break
+            duration=len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+            if duration < MIN_SEGMENT_SECONDS:
+                # end of a file source, or a click/cough
+                if not audio_data.frame_data:
+                    break
+                continue
+
+            # 16 kHz mono WAV is all Whisper needs, no ffmpeg/MP3 step in the loop
+            wav_bytes=audio_data.get_wav_data(convert_rate=16000, convert_width=2)
+            record_bytes("stt_upload", len(wav_bytes))
+            pending.append(_stt_executor.submit(
+                _transcribe_bytes, client, stt_model, f"segment_{segments}.wav", wav_bytes, language
+            ))
+            segments+=1
+            yield from finished()
+
+    logging.info("Recording complete.")
+    for future in pending:
+        text=future.result()
+        if text:
+            yield text
+
+def record_and_transcribe(source=None, **kwargs):
+    """Streaming capture, returns the full transcript once the patient stops talking"""
+    return " ".join(stream_transcription(source, **kwargs))
 
-    return transcription.text
\ No newline at end of file
+# print(record_and_transcribe(sr.AudioFile("patient_voice_test.wav")))